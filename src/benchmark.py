@@ -0,0 +1,154 @@
+""" Micro-benchmarks for graph, serialisation and word bank hot paths
+
+Usage: python -m src.benchmark [--players 4 16] [--vertices 100 1000] [--words 1000 20000] [--seed 0]
+                               [--repeat 5] [--save baseline.json] [--compare baseline.json] [--threshold 1.2]
+
+Every case is run with random generators seeded by --seed, so results are comparable between runs.
+Each result is the median time of one operation over --repeat runs, --save stores results as JSON
+and --compare prints ratio to stored results marking slowdowns above --threshold.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from src.graph import Graph
+from src.room import Room
+from src.vertex import Vertex
+from src.word_bank import WordBank
+
+REGRESSION_THRESHOLD = 1.2  # default ratio to baseline above which result is reported as regression
+QUERIES = 1000  # reachable queries per call
+MIN_RUN_TIME = 0.05  # seconds, short operations are called many times per run
+
+
+def measure(operation: Callable[[], object], repeat: int) -> float:
+    """Median seconds per call of operation, each run calls it enough times to last MIN_RUN_TIME"""
+    count = 1
+    while True:  # calibrate calls per run
+        start = time.perf_counter()
+        for _ in range(count):
+            operation()
+        if time.perf_counter() - start >= MIN_RUN_TIME:
+            break
+        count *= 2
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(count):
+            operation()
+        times.append((time.perf_counter() - start) / count)
+    return statistics.median(times)
+
+
+def graph_cases(players: int, vertices: int, seed: int, repeat: int) -> Dict[str, float]:
+    """Generation, queries and (de)serialisation of graph with given size"""
+    nicknames = [f"player{i}" for i in range(players)]
+    dense = max(1, vertices // players - 1)
+    prefix = f"graph[p={players},v={vertices}]"
+    results: Dict[str, float] = {}
+
+    def generate() -> Graph:
+        graph = Graph()
+        graph.generate(nicknames, (1000, 1000), dense, seed)
+        return graph
+
+    results[f"{prefix} generate"] = measure(generate, repeat)
+    graph = generate()
+    rng = random.Random(seed)
+    for i in rng.sample(range(len(graph.vertices)), len(graph.vertices) // 3):
+        graph.set_owner(i, rng.choice(nicknames))
+
+    queries = [(rng.choice(nicknames), rng.randrange(len(graph.vertices))) for _ in range(QUERIES)]
+    results[f"{prefix} reachable"] = measure(
+        lambda: [graph.reachable(nickname, vertex) for nickname, vertex in queries], repeat
+    ) / QUERIES
+
+    data = graph.to_dict()
+    results[f"{prefix} to_dict"] = measure(graph.to_dict, repeat)
+    results[f"{prefix} from_dict"] = measure(lambda: Graph().from_dict(data), repeat)
+    vertex_data = data["vertices"]
+    results[f"{prefix} Vertex.from_dict"] = measure(
+        lambda: [Vertex.from_dict(vertex) for vertex in vertex_data], repeat
+    ) / len(vertex_data)
+
+    packed = graph.to_bytes()
+    loaded = Graph()
+    loaded.from_bytes(packed)
+    results[f"{prefix} to_bytes"] = measure(graph.to_bytes, repeat)
+    results[f"{prefix} from_bytes"] = measure(lambda: Graph().from_bytes(packed), repeat)
+    results[f"{prefix} from_bytes in place"] = measure(lambda: loaded.from_bytes(packed), repeat)
+    return results
+
+
+def word_cases(words: int, seed: int, repeat: int) -> Dict[str, float]:
+    """Word bank loading and sampling with dictionary of given size"""
+    with open(os.path.join("src", "data", "words.txt"), "r", encoding="utf-8") as file:
+        dictionary = file.read().split()
+    random.seed(seed)
+    dictionary = random.sample(dictionary, min(words, len(dictionary)))
+    prefix = f"words[n={len(dictionary)}]"
+    results: Dict[str, float] = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "words.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(dictionary))
+        results[f"{prefix} load"] = measure(lambda: WordBank(path), repeat)
+        room = Room("benchmark", WordBank(path))
+    sizes = range(5, 16)
+    results[f"{prefix} get_words"] = measure(lambda: [room.get_words(size) for size in sizes], repeat) / len(sizes)
+    return results
+
+
+def report(results: Dict[str, float], baseline: Dict[str, float] | None, threshold: float) -> None:
+    """Print results, with ratio to baseline if given"""
+    width = max(len(name) for name in results)
+    for name, seconds in results.items():
+        line = f"{name:<{width}}  {seconds * 1e6:12.2f} us"
+        if baseline and name in baseline:
+            ratio = seconds / baseline[name]
+            line += f"  x{ratio:.2f}"
+            if ratio > threshold:
+                line += "  REGRESSION"
+        print(line)
+
+
+def main(argv: List[str] | None = None) -> None:
+    """Run benchmarks and print report"""
+    parser = argparse.ArgumentParser(prog="python -m src.benchmark", description="Benchmark game hot paths")
+    parser.add_argument("--players", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--vertices", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--words", type=int, nargs="+", default=[1000, 20000], help="dictionary sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="store results as JSON baseline")
+    parser.add_argument("--compare", help="compare with JSON baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="regression ratio")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, float] = {}
+    for players in args.players:
+        for vertices in args.vertices:
+            results.update(graph_cases(players, vertices, args.seed, args.repeat))
+    for words in args.words:
+        results.update(word_cases(words, args.seed, args.repeat))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+    report(results, baseline, args.threshold)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+""" Headless bot client, speaks the same protocol as Client without tkinter and pygame """
+
+import asyncio
+import base64
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from src.connection import Connection
+from src.graph import Graph
+from src.server_config import DEFAULT_ROOM
+
+
+class Bot:
+    """Bot player: joins room, moves to reachable vertices and types their words at given speed"""
+
+    def __init__(self, nickname: str, room: str = DEFAULT_ROOM, wpm: float = 60):
+        self.nickname = nickname
+        self.room = room
+        self.wpm = wpm  # typed words per minute
+
+        self.connection: Connection = None
+        self.graph = Graph()
+        self.legend: Dict[str, int] = {}
+        self.version: int = 0
+        self.resyncing: bool = False
+        self.subscribed = asyncio.Event()  # set by first snapshot
+
+        self.current_vertex: int = None
+        self.words: List[str] = []
+        self.words_arrived = asyncio.Event()
+        self.seq: int = 0
+        self.unacknowledged: Deque[Tuple[int, float]] = deque()  # seq and send time of attacks not applied yet
+        self.latencies: List[float] = []  # seconds from sending attack to delta acknowledging it was applied
+
+    async def run(self, host: str, port: int | str) -> None:
+        """Join game, play until its time is over"""
+        self.connection = Connection(self.handle_push)
+        await self.connection.open(host, port)
+        try:
+            response = await self.connection.request(
+                {"command": "connect", "nickname": self.nickname, "color": self.color(), "room": self.room}
+            )
+            if response != "connected":
+                raise ConnectionError(f"bot {self.nickname} not connected: {response}")
+            while await self.connection.request({"command": "get", "argument": "state"}) != "game started":
+                await asyncio.sleep(0.1)
+            await self.connection.request({"command": "subscribe", "nickname": self.nickname})
+            await self.subscribed.wait()
+            await self.play()
+        except ConnectionError:  # server closed connection, game is over
+            pass
+        finally:
+            await self.connection.close()
+
+    async def play(self) -> None:
+        """Choose target vertex and type its words one by one"""
+        delay = 60 / self.wpm
+        while self.legend.get("time", 0) > 1:
+            if self.current_vertex is None or not self.worth_attacking(self.current_vertex) or not self.words:
+                target = self.choose_target()
+                if target is None:
+                    await asyncio.sleep(delay)
+                    continue
+                if target != self.current_vertex:
+                    self.words_arrived.clear()
+                    await self.connection.request({"command": "change", "argument": target})
+                    try:
+                        await asyncio.wait_for(self.words_arrived.wait(), 1)
+                    except asyncio.TimeoutError:
+                        continue
+                if not self.words:
+                    await asyncio.sleep(delay)
+                    continue
+            await asyncio.sleep(delay)
+            self.words.pop(0)
+            self.seq += 1
+            self.unacknowledged.append((self.seq, time.perf_counter()))
+            await self.connection.request(
+                {"command": "attack", "argument": self.current_vertex, "count": 1, "seq": self.seq}
+            )
+
+    def worth_attacking(self, vertex: int) -> bool:
+        """Vertex is reachable, has words and is not ours yet"""
+        return (
+            self.graph.reachable(self.nickname, vertex)
+            and not self.graph.vertices[vertex].is_main
+            and self.graph.vertices[vertex].owner != self.nickname
+        )
+
+    def choose_target(self) -> int | None:
+        """Weakest reachable vertex not owned by bot"""
+        targets = [i for i in range(len(self.graph.vertices)) if self.worth_attacking(i)]
+        if not targets:
+            return None
+        return min(targets, key=lambda i: (self.graph.vertices[i].hp, random.random()))
+
+    def handle_push(self, update: Dict[str, Any]) -> None:
+        """Apply message pushed by server, resubscribe if some deltas were missed"""
+        if update["type"] == "words":
+            if update["reset"]:
+                self.current_vertex = update["vertex"]
+                self.words = update["words"].split()
+                self.words_arrived.set()
+            elif update["vertex"] == self.current_vertex:
+                self.words.extend(update["words"].split())
+            return
+        if update["type"] == "delta" and update["version"] <= self.version:
+            return
+        if update["type"] == "delta" and update["version"] != self.version + 1:
+            if not self.resyncing:
+                self.resyncing = True
+                asyncio.create_task(self.connection.request({"command": "subscribe", "nickname": self.nickname}))
+            return
+        if update["type"] == "snapshot":
+            self.resyncing = False
+            self.graph.from_bytes(base64.b64decode(update["graph"]))
+            self.legend = dict(update["legend"])
+            self.subscribed.set()
+        else:
+            self.graph.apply_changes(update["vertices"])
+            self.legend.update(update["legend"])
+        self.version = update["version"]
+        if self.nickname in update["acks"]:  # includes queueing and game loop time, not only request handling
+            now = time.perf_counter()
+            while self.unacknowledged and self.unacknowledged[0][0] <= update["acks"][self.nickname]:
+                self.latencies.append(now - self.unacknowledged.popleft()[1])
+
+    @staticmethod
+    def color() -> List[int]:
+        """Random player color"""
+        return [random.randrange(256) for _ in range(3)]
@@ -1,15 +1,16 @@
 """ Client module """
 
-import ast
 import asyncio
-import json
+import base64
 import threading
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Tuple
 
 import tkinter as tk
 from tkinter import colorchooser, messagebox
 
+from src.connection import Connection
 from src.graph import Graph
+from src.server_config import DEFAULT_ROOM, MAX_NICKNAME_LENGTH, MAX_ROOM_NAME_LENGTH
 from src.view import View
 
 
@@ -24,11 +25,16 @@ class Client:
         self.nickname: str = None
         self.color: Tuple[int, int, int] = None
         self.address: str = None
+        self.room: str = None
 
-        self.reader: asyncio.StreamReader = None
-        self.writer: asyncio.StreamWriter = None
+        self.connection: Connection = None
+        self.version: int = 0  # last applied game state version
+        self.resyncing: bool = False  # snapshot requested after missed delta
+        self.resync_task: asyncio.Task = None
 
         self.view: View = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self.events: asyncio.Queue[Tuple[str, int, int]] = asyncio.Queue()  # player actions from view thread
         self.lock = threading.Lock()
 
     async def run(self):
@@ -36,72 +42,129 @@ class Client:
         connected = False
         while not connected:
             self.run_menu()
-            self.reader, self.writer = await asyncio.open_connection(*self.address.split(":"))
-            connect_data = f'{{"command": "connect", "nickname": "{self.nickname}", "color": {list(self.color)}}}'
-            response = await self.query(connect_data)
+            self.connection = Connection(self.handle_push)
+            await self.connection.open(*self.address.split(":"))
+            response = await self.query(
+                {"command": "connect", "nickname": self.nickname, "color": list(self.color), "room": self.room}
+            )
             if response == "connected":
                 connected = True
             else:
+                await self.connection.close()
                 messagebox.showerror("Error", response)
 
-        message = ""
-        while message != "game started":
-            message = await self.query('{"command": "get", "argument": "state"}')
+        while await self.query({"command": "get", "argument": "state"}) != "game started":
             await asyncio.sleep(1)
         self.graph = Graph()
-        self.graph.from_dict(json.loads(await self.query('{"command": "get", "argument": "graph"}')))
-        self.color_scheme = json.loads(await self.query('{"command": "get", "argument": "color_scheme"}'))
-        self.legend = json.loads(await self.query('{"command": "get", "argument": "legend"}'))
+        self.legend = {}
+        self.color_scheme, _ = await asyncio.gather(
+            self.query({"command": "get", "argument": "color_scheme"}), self.subscribe()
+        )
 
+        self.loop = asyncio.get_running_loop()
         view_thread = threading.Thread(target=self.create_view)
         view_thread.start()
 
         while self.view is None:
             await asyncio.sleep(0.2)
-        new_words: List[str] = []
-
-        while self.view.legend.get("time") > 1:
-            while not self.view.events.empty():
-                event = self.view.events.get()
-                if event[0] == "attack":
-                    await self.query('{"command": "attack", "argument": ' + str(event[1]) + "}")
-                elif event[0] == "change":
-                    await self.query('{"command": "change", "argument": ' + str(event[1]) + "}")
-                    response = await self.query('{"command": "get", "argument": "words"}')
-                    if response.startswith("["):
-                        new_words = ast.literal_eval(response)
+        events_task = asyncio.create_task(self.send_events())
 
+        while view_thread.is_alive() and self.view.legend.get("time") > 1:
             await asyncio.sleep(0.5)
-            new_graph = json.loads(await self.query('{"command": "get", "argument": "graph"}'))
-            new_legend = json.loads(await self.query('{"command": "get", "argument": "legend"}'))
-
-            with self.lock:
-                self.view.graph_.from_dict(new_graph)
-                self.view.legend_ = new_legend
-                if new_words:
-                    self.view.words = new_words
-                    new_words = []
         self.view.running = False
+        events_task.cancel()
+        await self.connection.close()
         view_thread.join()
 
+    async def subscribe(self) -> None:
+        """Ask server to push game state updates, snapshot comes as first pushed message"""
+        await self.query({"command": "subscribe", "nickname": self.nickname})
+
+    def handle_push(self, update: Dict[str, Any]) -> None:
+        """Apply message pushed by server, request snapshot if some deltas were missed"""
+        if update["type"] == "words":
+            self.apply_words(update)
+            return
+        if update["type"] == "delta" and update["version"] <= self.version:
+            return  # already in snapshot
+        if update["type"] == "delta" and update["version"] != self.version + 1:
+            if not self.resyncing:
+                self.resyncing = True
+                self.resync_task = asyncio.create_task(self.subscribe())
+            return
+        if update["type"] == "snapshot":
+            self.resyncing = False
+        self.apply_update(update)
+
+    def apply_words(self, update: Dict[str, Any]) -> None:
+        """Replace or top up view words, reset also moves current vertex (it may be forced by server)"""
+        if self.view is None:
+            return
+        words = update["words"].split()
+        vertex_name = self.graph.vertices[update["vertex"]].name
+        with self.lock:
+            if update["reset"]:
+                self.view.current_vertex = vertex_name
+                self.view.words = words
+            elif self.view.current_vertex == vertex_name:
+                self.view.words.extend(words)
+
+    def apply_update(self, update: Dict[str, Any]) -> None:
+        """Apply snapshot or delta to graph and legend"""
+        with self.lock:
+            if update["type"] == "snapshot":
+                self.graph.from_bytes(base64.b64decode(update["graph"]))
+                self.legend = dict(update["legend"])
+            else:
+                self.graph.apply_changes(update["vertices"])
+                self.legend = {**self.legend, **update["legend"]}
+            if self.view is not None:  # new dict is swapped in, view thread may be iterating over old one
+                self.view.legend_ = self.legend
+            self.version = update["version"]
+            if self.view is not None and self.nickname in update["acks"]:
+                self.view.acknowledge(update["acks"][self.nickname])
+
+    async def send_events(self) -> None:
+        """Send player actions to server as soon as they happen
+
+        Events queued while previous commands were in flight are sent together, attacks typed in a row
+        on one vertex are merged into one command.
+        """
+        while True:
+            events = [await self.events.get()]
+            while not self.events.empty():
+                events.append(self.events.get_nowait())
+
+            commands: List[Dict[str, Any]] = []
+            for kind, vertex, seq in events:
+                if kind == "attack" and commands and commands[-1].get("seq") and commands[-1]["argument"] == vertex:
+                    commands[-1]["count"] += 1
+                    commands[-1]["seq"] = seq
+                elif kind == "attack":
+                    commands.append({"command": "attack", "argument": vertex, "count": 1, "seq": seq})
+                else:  # words for new vertex after change are pushed by server
+                    commands.append({"command": kind, "argument": vertex})
+            await asyncio.gather(*(self.query(command) for command in commands))
+
     def create_view(self):
         """Create and run view"""
-        self.view = View(self.color_scheme, self.graph, self.nickname, self.legend)
-        self.view.lock = self.lock
+        view = View(self.color_scheme, self.graph, self.nickname, self.legend)
+        view.lock = self.lock
+        view.on_event = lambda event: self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+        with self.lock:  # legend may have been swapped while view was created
+            view.legend_ = self.legend
+            self.view = view
         self.view.run()
 
-    async def query(self, data: str) -> str:
-        """Query server"""
-        self.writer.write(data.encode())
-        await self.writer.drain()
-        response = await self.reader.read(4096)
-        return response.decode()
+    async def query(self, command: Dict[str, Any]) -> Any:
+        """Query server, several queries can be in flight at once"""
+        return await self.connection.request(command)
 
     def run_menu(self) -> None:
         """Run menu"""
         root = tk.Tk()
         root.title("Client menu")
-        root.geometry("200x200")
+        root.geometry("200x250")
         root.resizable(False, False)
 
         nickname_label = tk.Label(root, text="Nickname:")
@@ -123,15 +186,25 @@ class Client:
         address_entry.insert(0, self.address if self.address else "")
         address_entry.pack()
 
+        room_label = tk.Label(root, text="Room:")
+        room_label.pack()
+        room_entry = tk.Entry(root, width=20)
+        room_entry.insert(0, self.room if self.room else DEFAULT_ROOM)
+        room_entry.pack()
+
         def save():
-            if not nickname_entry.get() or not address_entry.get() or not self.color:
+            if not nickname_entry.get() or not address_entry.get() or not room_entry.get() or not self.color:
                 messagebox.showerror("Error", "Fill all fields")
                 return
-            if len(nickname_entry.get()) > 14:
-                messagebox.showerror("Error", "Nickname is too long (max 14)")
+            if len(nickname_entry.get()) > MAX_NICKNAME_LENGTH:
+                messagebox.showerror("Error", f"Nickname is too long (max {MAX_NICKNAME_LENGTH})")
+                return
+            if len(room_entry.get()) > MAX_ROOM_NAME_LENGTH:
+                messagebox.showerror("Error", f"Room name is too long (max {MAX_ROOM_NAME_LENGTH})")
                 return
             self.nickname = nickname_entry.get()
             self.address = address_entry.get()
+            self.room = room_entry.get()
             root.destroy()
 
         connect_button = tk.Button(root, text="Save", command=save)
@@ -0,0 +1,67 @@
+""" Client connection module """
+
+import asyncio
+import itertools
+import json
+from typing import Any, Callable, Dict
+
+from src import protocol
+
+
+class Connection:
+    """Connection to game server allowing many requests in flight
+
+    Every request gets an id and its response is matched back by a background reader task,
+    frames without id are messages pushed by server and are passed to on_push.
+    """
+
+    def __init__(self, on_push: Callable[[Dict[str, Any]], None] = lambda message: None):
+        self.on_push = on_push
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+        self.reader_task: asyncio.Task = None
+        self.ids = itertools.count(1)
+        self.waiting: Dict[int, asyncio.Future] = {}  # request id -> future for response
+
+    async def open(self, host: str, port: int | str) -> None:
+        """Connect to server and start reading responses"""
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.reader_task = asyncio.create_task(self.__read_loop())
+
+    async def request(self, command: Dict[str, Any]) -> Any:
+        """Send command and wait for its response"""
+        if self.reader_task.done() or self.writer.is_closing():  # nothing would resolve response future
+            raise ConnectionError("connection closed")
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        protocol.write_frame(self.writer, json.dumps({**command, "id": request_id}))
+        await self.writer.drain()
+        return await future
+
+    async def close(self) -> None:
+        """Stop reader task and close connection"""
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+    async def __read_loop(self) -> None:
+        """Dispatch responses to waiting requests and pushed messages to on_push"""
+        try:
+            while True:
+                message = await protocol.read_frame(self.reader)
+                if message is None:
+                    break
+                data = json.loads(message)
+                if "id" not in data:
+                    self.on_push(data)
+                    continue
+                future = self.waiting.pop(data["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(data["response"])
+        finally:
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("server closed connection"))
+            self.waiting.clear()
@@ -0,0 +1,137 @@
+""" Graph generation helpers working on numpy point arrays """
+
+from random import Random
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+CANDIDATES_COUNT = 1000  # candidate points rated for each new vertex
+POOL_FACTOR = 8  # candidate pool size per placed vertex
+CONNECT_MARGIN = 0.1  # part of connecting distance added to it on large maps
+LOCAL_FACTOR = 2  # large maps connect vertices closer than this many median spanning tree edges
+
+NAME_ONSETS = ["b", "br", "c", "d", "dr", "f", "g", "gr", "h", "k", "l", "m", "n", "p", "r", "s", "st", "t", "v", "z"]
+NAME_VOWELS = ["a", "e", "i", "o", "u", "ai", "ea", "ou"]
+NAME_CODAS = ["", "", "n", "r", "s", "l", "x"]
+
+
+def best_points(
+    existing: List[Tuple[int, int]], count: int, bounds: Tuple[int, int], rng: np.random.Generator
+) -> List[Tuple[int, int]]:
+    """Place count points one by one, each at the least crowded of random candidates
+
+    Candidates come from a pool sampled once, whose crowd rates are updated incrementally
+    after every placed point instead of being recounted against all vertices.
+    """
+    radius = min(bounds) * 0.2
+    pool_size = max(CANDIDATES_COUNT * 4, count * POOL_FACTOR)
+    pool = np.column_stack(
+        (
+            rng.integers(int(bounds[0] * 0.1), int(bounds[0] * 0.9), pool_size),
+            rng.integers(int(bounds[1] * 0.1), int(bounds[1] * 0.9), pool_size),
+        )
+    ).astype(float)
+    rates = np.zeros(pool_size)
+
+    def place(point: np.ndarray) -> None:
+        distances = np.hypot(pool[:, 0] - point[0], pool[:, 1] - point[1])
+        rates[:] += np.clip(radius - distances, 0, None)
+
+    for point in existing:
+        place(point)
+
+    points = []
+    for _ in range(count):
+        candidates = rng.integers(0, pool_size, CANDIDATES_COUNT)
+        best = candidates[np.argmin(rates[candidates])]
+        if np.isinf(rates[best]):  # all candidates already taken
+            best = np.argmin(rates)
+        points.append((int(pool[best, 0]), int(pool[best, 1])))
+        place(pool[best])
+        rates[best] = np.inf
+    return points
+
+
+def spanning_tree(points: np.ndarray) -> List[Tuple[int, int, float]]:
+    """Minimum spanning tree edges of points as (vertex1, vertex2, length), built with Prim's algorithm"""
+    count = len(points)
+    in_tree = np.zeros(count, dtype=bool)
+    nearest = np.full(count, np.inf)  # distance from tree to each vertex
+    parent = np.zeros(count, dtype=int)  # tree vertex nearest to each vertex
+    current = 0
+    edges: List[Tuple[int, int, float]] = []
+    for _ in range(count - 1):
+        in_tree[current] = True
+        distances = np.hypot(points[:, 0] - points[current, 0], points[:, 1] - points[current, 1])
+        closer = distances < nearest
+        nearest[closer] = distances[closer]
+        parent[closer] = current
+        nearest[in_tree] = np.inf
+        current = int(np.argmin(nearest))
+        edges.append((int(parent[current]), current, float(nearest[current])))
+    return edges
+
+
+def connecting_distance(points: np.ndarray) -> float:
+    """Minimal distance threshold that makes graph of points connected (longest minimum spanning tree edge)"""
+    return max((length for _, _, length in spanning_tree(points)), default=0.0)
+
+
+def sparse_edges(points: np.ndarray) -> List[Tuple[int, int]]:
+    """Edges of large maps: pairs closer than connecting distance with margin, capped at LOCAL_FACTOR typical
+    spanning tree edges so one remote vertex does not connect everything, plus tree edges keeping graph connected
+    """
+    tree = spanning_tree(points)
+    if not tree:
+        return []
+    lengths = sorted(length for _, _, length in tree)
+    distance = min(lengths[-1], lengths[len(lengths) // 2] * LOCAL_FACTOR) * (1 + CONNECT_MARGIN)
+    edges = {(min(edge), max(edge)) for edge in edges_within(points, distance)}
+    edges.update((min(vertex1, vertex2), max(vertex1, vertex2)) for vertex1, vertex2, _ in tree)
+    return sorted(edges)
+
+
+def edges_within(points: np.ndarray, distance: float) -> List[Tuple[int, int]]:
+    """All pairs of points closer than distance, found with spatial grid of distance-sized cells"""
+    if distance <= 0:
+        return []
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    for i, cell in enumerate((points // distance).astype(int).tolist()):
+        grid.setdefault(tuple(cell), []).append(i)
+    cells = {cell: np.array(indices) for cell, indices in grid.items()}
+
+    edges: List[Tuple[int, int]] = []
+    for (cell_x, cell_y), indices in cells.items():
+        for shift_x, shift_y in ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)):  # each pair of cells checked once
+            others = cells.get((cell_x + shift_x, cell_y + shift_y))
+            if others is None:
+                continue
+            difference = points[indices][:, None, :] - points[others][None, :, :]
+            close = np.hypot(difference[..., 0], difference[..., 1]) < distance
+            if shift_x == 0 and shift_y == 0:
+                close = np.triu(close, 1)
+            rows, columns = np.nonzero(close)
+            edges.extend(zip(indices[rows].tolist(), others[columns].tolist()))
+    return edges
+
+
+def procedural_name(random: Random) -> str:
+    """Random pronounceable name of two or three syllables (letters only, at most 15)"""
+    syllables = [
+        random.choice(NAME_ONSETS) + random.choice(NAME_VOWELS) + random.choice(NAME_CODAS)
+        for _ in range(random.randrange(2, 4))
+    ]
+    return "".join(syllables).capitalize()
+
+
+def unique_names(count: int, pool: List[str], random: Random) -> List[str]:
+    """Pick count distinct names, random ones from pool first, then procedural ones"""
+    pool = list(pool)
+    names = [pool.pop(random.randrange(len(pool))) for _ in range(min(count, len(pool)))]
+    used = set(names) | set(pool)
+    while len(names) < count:
+        name = procedural_name(random)
+        if name not in used:
+            used.add(name)
+            names.append(name)
+    return names
@@ -1,9 +1,13 @@
 """ Graph class module """
 
+import math
 import os
-from random import randrange
-from typing import Any, Dict, List, Tuple
+from random import Random
+from typing import Any, Dict, List, Set, Tuple
 
+import numpy as np
+
+from src import generator, snapshot
 from src.vertex import Vertex
 
 
@@ -15,166 +19,177 @@ class Graph:
         self.edges: List[Tuple[int, int]] = []
         self.bounds: Tuple[int, int] = (0, 0)
         self.dense: int = 0  # dense shows how many vertices for each player there are
-
-    def generate(self, nicknames: List[str], bounds: Tuple[int, int] = (500, 500), dense: int = 3) -> None:
-        """Generate graph"""
-        assert len(nicknames) <= 4, "Too many players"
+        self.revision: int = 0  # increased on every change of vertices
+        self.owners_revision: int = 0  # increased on change of layout or vertex owners, not on hp change
+        self.layout: int | None = None  # checksum of packed layout if loaded from snapshot bytes
+
+        self.adjacency: List[Set[int]] = []  # vertex index -> neighbour indices
+        self.owned: Dict[str, Set[int]] = {}  # owner -> owned vertex indices
+        self.names: Dict[str, int] = {}  # vertex name -> vertex index
+        self.mains: Dict[str, int] = {}  # owner -> main vertex index
+
+    def generate(
+        self, nicknames: List[str], bounds: Tuple[int, int] = (500, 500), dense: int = 3, seed: int | None = None
+    ) -> None:
+        """Generate graph, same seed and players count give same graph"""
+        random = Random(seed)
         vertices_count = len(nicknames) * (dense + 1)
         self.bounds = bounds
         self.dense = dense
 
-        start_points = self.__get_start_points(len(nicknames))
+        start_points = self.__get_start_points(len(nicknames), random)
         self.vertices = [
             Vertex(start_points[i][0], start_points[i][1], nicknames[i], True, 12, hp=-1) for i in range(len(nicknames))
         ]
 
-        while len(self.vertices) < vertices_count:
-            point = self.__get_best_point(bounds)
-            self.vertices.append(Vertex(point[0], point[1], None, False, randrange(5, 16)))  # add best with random size
+        rng = np.random.default_rng(random.randrange(2**32))
+        for point in generator.best_points(start_points, vertices_count - len(self.vertices), bounds, rng):
+            size = random.randrange(5, 16)
+            self.vertices.append(Vertex(point[0], point[1], None, False, size))  # add best with random size
 
         names = []
         with open(os.path.join("src", "data", "names.txt"), "r", encoding="utf-8") as file:
             names = file.read().splitlines()
-        for vertex in self.vertices:  # pick random names for vertices
-            vertex.name = names.pop(randrange(len(names)))
-
-        coefficient_range = [i / 20 for i in range(1, 20)]
-        for coefficient in coefficient_range:
-            for vertex in self.vertices:
-                for other_vertex in self.vertices:
-                    if vertex == other_vertex:
-                        continue
-                    if self.distance((vertex.x, vertex.y), (other_vertex.x, other_vertex.y)) < bounds[0] * coefficient:
-                        self.edges.append(
-                            (
-                                self.vertices.index(vertex),
-                                self.vertices.index(other_vertex),
-                            )
-                        )
-            if self.__graph_connected():
-                break
-            self.edges = []
-
-    def __graph_connected(self) -> bool:
-        """Check if graph is connected"""
-        visited = [False for _ in range(len(self.vertices))]
-        to_visit = [0]
-
-        while to_visit:
-            vertex = to_visit.pop()
-            visited[vertex] = True
-            for edge in self.edges:
-                if vertex in edge:
-                    next_vertex = edge[1] if edge[0] == vertex else edge[0]
-                    if not visited[next_vertex]:
-                        to_visit.append(next_vertex)
-        return all(visited)
-
-    def __get_start_points(self, count: int) -> List[Tuple[int, int]]:
+        for vertex, name in zip(self.vertices, generator.unique_names(len(self.vertices), names, random)):
+            vertex.name = name
+
+        points = np.array([(vertex.x, vertex.y) for vertex in self.vertices], dtype=float)
+        if len(nicknames) > 4:  # width based distance gives far too many edges on large maps
+            self.edges = generator.sparse_edges(points)
+        else:  # use smallest distance coefficient (from 0.05 to 0.95 of width) keeping graph connected
+            threshold = generator.connecting_distance(points)
+            coefficient_range = [i / 20 for i in range(1, 20)]
+            distance = next(
+                (bounds[0] * coefficient for coefficient in coefficient_range if bounds[0] * coefficient > threshold),
+                threshold + 1,
+            )
+            self.edges = generator.edges_within(points, distance)
+        self.__build_index()
+
+    def __build_index(self) -> None:
+        """Rebuild adjacency, owner and name indexes from vertices and edges"""
+        self.revision += 1
+        self.owners_revision += 1
+        self.adjacency = [set() for _ in range(len(self.vertices))]
+        for vertex1, vertex2 in self.edges:
+            self.adjacency[vertex1].add(vertex2)
+            self.adjacency[vertex2].add(vertex1)
+        self.owned = {}
+        self.names = {}
+        self.mains = {}
+        for i, vertex in enumerate(self.vertices):
+            self.names.setdefault(vertex.name, i)
+            if vertex.owner is not None:
+                self.owned.setdefault(vertex.owner, set()).add(i)
+                if vertex.is_main:
+                    self.mains.setdefault(vertex.owner, i)
+
+    def set_owner(self, vertex: int, owner: str | None) -> None:
+        """Change vertex owner keeping indexes in sync"""
+        old_owner = self.vertices[vertex].owner
+        if old_owner == owner:
+            return
+        self.owners_revision += 1
+        if old_owner is not None:
+            self.owned[old_owner].discard(vertex)
+            if self.mains.get(old_owner) == vertex:  # lost main, fall back to other owned main if any
+                del self.mains[old_owner]
+                other_mains = [i for i in self.owned[old_owner] if self.vertices[i].is_main]
+                if other_mains:
+                    self.mains[old_owner] = min(other_mains)
+        if owner is not None:
+            self.owned.setdefault(owner, set()).add(vertex)
+            if self.vertices[vertex].is_main and vertex < self.mains.get(owner, len(self.vertices)):
+                self.mains[owner] = vertex
+        self.vertices[vertex].owner = owner
+
+    def __get_start_points(self, count: int, random: Random) -> List[Tuple[int, int]]:
         """Get start points"""
-        start_points = [(randrange(0, self.bounds[0]), randrange(0, self.bounds[1]))]
+        start_points = [(random.randrange(0, self.bounds[0]), random.randrange(0, self.bounds[1]))]
         if count == 2:
             start_points = [
                 (
-                    randrange(0, int(self.bounds[0] * 0.1)),
-                    randrange(0, self.bounds[1]),
+                    random.randrange(0, int(self.bounds[0] * 0.1)),
+                    random.randrange(0, self.bounds[1]),
                 ),  # left side
                 (
-                    randrange(int(self.bounds[0] * 0.9), self.bounds[0]),
-                    randrange(0, self.bounds[1]),
+                    random.randrange(int(self.bounds[0] * 0.9), self.bounds[0]),
+                    random.randrange(0, self.bounds[1]),
                 ),  # right side
             ]
         elif count == 3:
             start_points = [
                 (
-                    randrange(0, int(self.bounds[0] * 0.1)),
-                    randrange(0, int(self.bounds[1] * 0.1)),
+                    random.randrange(0, int(self.bounds[0] * 0.1)),
+                    random.randrange(0, int(self.bounds[1] * 0.1)),
                 ),  # top left
                 (
-                    randrange(int(self.bounds[0] * 0.9), self.bounds[0]),
-                    randrange(0, int(self.bounds[1] * 0.1)),
+                    random.randrange(int(self.bounds[0] * 0.9), self.bounds[0]),
+                    random.randrange(0, int(self.bounds[1] * 0.1)),
                 ),  # top right
                 (
-                    randrange(int(self.bounds[0] * 0.45), int(self.bounds[0] * 0.55)),
-                    randrange(int(self.bounds[1] * 0.9), self.bounds[1]),
+                    random.randrange(int(self.bounds[0] * 0.45), int(self.bounds[0] * 0.55)),
+                    random.randrange(int(self.bounds[1] * 0.9), self.bounds[1]),
                 ),  # bottom center
             ]
         elif count == 4:
             start_points = [
                 (
-                    randrange(0, int(self.bounds[0] * 0.1)),
-                    randrange(0, int(self.bounds[1] * 0.1)),
+                    random.randrange(0, int(self.bounds[0] * 0.1)),
+                    random.randrange(0, int(self.bounds[1] * 0.1)),
                 ),  # top left
                 (
-                    randrange(int(self.bounds[0] * 0.9), self.bounds[0]),
-                    randrange(0, int(self.bounds[1] * 0.1)),
+                    random.randrange(int(self.bounds[0] * 0.9), self.bounds[0]),
+                    random.randrange(0, int(self.bounds[1] * 0.1)),
                 ),  # top right
                 (
-                    randrange(0, int(self.bounds[0] * 0.1)),
-                    randrange(int(self.bounds[1] * 0.9), self.bounds[1]),
+                    random.randrange(0, int(self.bounds[0] * 0.1)),
+                    random.randrange(int(self.bounds[1] * 0.9), self.bounds[1]),
                 ),  # bottom left
                 (
-                    randrange(int(self.bounds[0] * 0.9), self.bounds[0]),
-                    randrange(int(self.bounds[1] * 0.9), self.bounds[1]),
+                    random.randrange(int(self.bounds[0] * 0.9), self.bounds[0]),
+                    random.randrange(int(self.bounds[1] * 0.9), self.bounds[1]),
                 ),  # bottom right
             ]
+        elif count > 4:  # evenly spaced on ellipse near the borders, rotated randomly
+            shift = random.uniform(0, 2 * math.pi)
+            start_points = [
+                (
+                    int(self.bounds[0] * (0.5 + 0.45 * math.cos(shift + 2 * math.pi * i / count))),
+                    int(self.bounds[1] * (0.5 + 0.45 * math.sin(shift + 2 * math.pi * i / count))),
+                )
+                for i in range(count)
+            ]
         return start_points
 
-    def __get_best_point(self, bounds: Tuple[int, int]) -> Tuple[int, int]:
-        """Get the best point for new vertex"""
-        points_rate: List[List[Tuple[int, int], int]] = []  # list of pairs (point, rate)
-
-        for _ in range(1000):
-            points_rate.append(
-                [
-                    (
-                        randrange(int(bounds[0] * 0.1), int(bounds[0] * 0.9)),
-                        randrange(int(bounds[1] * 0.1), int(bounds[1] * 0.9)),
-                    ),
-                    0,
-                ]
-            )
-            for vertex in self.vertices:
-                if self.distance((vertex.x, vertex.y), points_rate[-1][0]) < min(bounds) * 0.2:
-                    points_rate[-1][1] += min(bounds) * 0.2 - self.distance((vertex.x, vertex.y), points_rate[-1][0])
-        points_rate.sort(key=lambda x: x[1], reverse=True)
-        return points_rate[-1][0]
-
     def distance(self, coordinate1: Tuple[int, int], coordinate2: Tuple[int, int]) -> float:
         """Calculate distance between two points"""
         return ((coordinate1[0] - coordinate2[0]) ** 2 + (coordinate1[1] - coordinate2[1]) ** 2) ** 0.5
 
     def connected(self, vertex1: int, vertex2: int) -> bool:
         """Check if two vertices are connected"""
-        for edge in self.edges:
-            if vertex1 in edge and vertex2 in edge:
-                return True
-        return False
+        return vertex2 in self.adjacency[vertex1]
 
     def reachable(self, name: str, vertex: int) -> bool:
         '''Check if vertex is reachable by "name"'''
-        for edge in self.edges:
-            if vertex in edge and (self.vertices[edge[0]].owner == name or self.vertices[edge[1]].owner == name):
-                return True
-        return False
+        neighbours = self.adjacency[vertex]
+        if not neighbours:
+            return False
+        if self.vertices[vertex].owner == name:
+            return True
+        return any(self.vertices[neighbour].owner == name for neighbour in neighbours)
 
     def count(self, name: str) -> int:
         """Count vertices owned by "name" """
-        return len([vertex for vertex in self.vertices if vertex.owner == name])
+        return len(self.owned.get(name, ()))
 
     def get_main(self, name: str) -> int:
         """Get main vertex index of name"""
-        for i, vertex in enumerate(self.vertices):
-            if vertex.owner == name and vertex.is_main:
-                return i
-        return None
+        return self.mains.get(name)
 
     def get_id(self, name: str) -> int:
         """Get vertex index by name"""
-        for i, vertex in enumerate(self.vertices):
-            if vertex.name == name:
-                return i
-        return None
+        return self.names.get(name)
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dict"""
@@ -185,9 +200,44 @@ class Graph:
             "dense": self.dense,
         }
 
+    def apply_changes(self, changes: Dict[str, Dict[str, Any]]) -> None:
+        """Apply vertex changes (index -> changed fields) from server delta"""
+        if not changes:  # timer and ack only deltas leave graph untouched
+            return
+        self.revision += 1
+        for index, fields in changes.items():
+            self.set_owner(int(index), fields["owner"])
+            self.vertices[int(index)].hp = fields["hp"]
+
     def from_dict(self, data: Dict[str, Any]) -> None:
         """Load from dict"""
         self.vertices = [Vertex.from_dict(vertex) for vertex in data["vertices"]]
         self.edges = data["edges"]
         self.bounds = data["bounds"]
         self.dense = data["dense"]
+        self.layout = None
+        self.__build_index()
+
+    def to_bytes(self) -> bytes:
+        """Convert to compact binary snapshot"""
+        return snapshot.pack(self)
+
+    def from_bytes(self, data: bytes) -> None:
+        """Load from binary snapshot, updating vertices in place if layout is already loaded"""
+        unpacked = snapshot.unpack(data, self.layout)
+        if unpacked["vertices"] is None:  # same layout, only owners and hp may differ
+            self.revision += 1
+            for i, vertex in enumerate(self.vertices):
+                self.set_owner(i, unpacked["owners"][i])
+                vertex.hp = unpacked["hp"][i]
+            return
+
+        self.vertices = unpacked["vertices"]
+        for vertex, owner, hp in zip(self.vertices, unpacked["owners"], unpacked["hp"]):
+            vertex.owner = owner
+            vertex.hp = hp
+        self.edges = unpacked["edges"]
+        self.bounds = unpacked["bounds"]
+        self.dense = unpacked["dense"]
+        self.layout = unpacked["layout"]
+        self.__build_index()
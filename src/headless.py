@@ -0,0 +1,91 @@
+''' Headless server entry point, configured with command line arguments and optional JSON config file
+
+Usage: python -m src.headless [--config server.json] [--host HOST] [--port PORT] [--bounds X Y] [--dense N]
+                              [--time SECONDS] [--min-players N] [--auto-start N] [--seed N] [--maps DIR]
+                              [--map-library-size N]
+                              [--log-level DEBUG|INFO|WARNING|ERROR] [--profile off|timers|cprofile]
+
+Config file keys are the same as long options with underscores (e.g. "min_players"), options given
+on command line override them. --profile overrides profiling mode from environment (see src.profiling).
+Imports neither tkinter nor pygame.
+'''
+
+import argparse
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List
+
+from src import profiling, snapshot
+from src.log import setup_logging
+from src.server import Server
+from src.server_config import DEFAULT_BOUNDS, DEFAULT_DENSE, DEFAULT_TIME, HOST, MAP_CACHE_DIR, MAP_LIBRARY_SIZE, MIN_PLAYERS, PORT
+
+DEFAULTS: Dict[str, Any] = {
+    "host": HOST,
+    "port": PORT,
+    "bounds": list(DEFAULT_BOUNDS),
+    "dense": DEFAULT_DENSE,
+    "time": DEFAULT_TIME,
+    "min_players": MIN_PLAYERS,
+    "auto_start": None,
+    "seed": None,
+    "maps": MAP_CACHE_DIR,
+    "map_library_size": MAP_LIBRARY_SIZE,
+    "log_level": "INFO",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_settings(argv: List[str] | None = None) -> Dict[str, Any]:
+    ''' Merge defaults, config file and command line options '''
+    parser = argparse.ArgumentParser(prog="python -m src.headless", description="Run game server without GUI")
+    parser.add_argument("--config", help="JSON file with server settings")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--bounds", type=int, nargs=2, metavar=("X", "Y"), help="field size of started games")
+    parser.add_argument("--dense", type=int, help="vertices per player in started games")
+    parser.add_argument("--time", type=int, help="game time in seconds")
+    parser.add_argument("--min-players", type=int, help="players needed to start game with start command")
+    parser.add_argument("--auto-start", type=int, help="start room game as soon as this many players joined")
+    parser.add_argument("--seed", type=int, help="map seed for every game, random cached map by default")
+    parser.add_argument("--maps", help="map library directory, empty to always generate maps")
+    parser.add_argument("--map-library-size", type=int, help="random maps per settings, 0 for new map every game")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], type=str.upper)
+    parser.add_argument("--profile", choices=profiling.MODES, help="phase timers, optionally with cProfile output")
+    args = parser.parse_args(argv)
+
+    settings = dict(DEFAULTS)
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as file:
+            config = json.load(file)
+        unknown = set(config) - set(DEFAULTS)
+        if unknown:
+            parser.error(f"unknown config keys: {', '.join(sorted(unknown))}")
+        settings.update(config)
+    settings.update({key: value for key, value in vars(args).items() if key in DEFAULTS and value is not None})
+    if args.profile is not None:
+        profiling.configure(args.profile)
+    settings["bounds"] = tuple(settings["bounds"])
+    if max(settings["bounds"]) > snapshot.MAX_FIELD or settings["dense"] > snapshot.MAX_FIELD:
+        parser.error(f"bounds and dense must not exceed {snapshot.MAX_FIELD}")
+    settings["maps"] = settings["maps"] or None
+    return settings
+
+
+def main(argv: List[str] | None = None) -> None:
+    ''' Run headless server until interrupted '''
+    settings = parse_settings(argv)
+    setup_logging(settings.pop("log_level"))
+    logger.info("headless server settings: %s", settings)
+    server = Server(**settings)
+    with profiling.Session("server"):
+        try:
+            asyncio.run(server.run())
+        except KeyboardInterrupt:
+            logger.info("interrupted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+""" Load test: runs headless server in subprocess and plays many bots against it
+
+Usage: python -m src.loadtest [--bots 200] [--room-size 4] [--wpm 60] [--time 20] [--port 5100]
+
+Reports attack latency percentiles (until delta acknowledging attack was applied), command throughput, server CPU time and server side metrics.
+"""
+
+import argparse
+import asyncio
+import resource
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from src.bot import Bot
+from src.connection import Connection
+
+STARTUP_TIMEOUT = 10  # seconds to wait for server to start listening
+
+
+def percentile(values: List[float], part: float) -> float:
+    """Value below which given part of sorted values lie"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(part * len(values)))]
+
+
+async def wait_listening(host: str, port: int) -> None:
+    """Wait until server accepts connections"""
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run_bots(args: argparse.Namespace) -> List[Bot]:
+    """Play all bots until their games end"""
+    bots = [Bot(f"bot{i}", f"load{i // args.room_size}", args.wpm) for i in range(args.bots)]
+    await asyncio.gather(*(bot.run(args.host, args.port) for bot in bots))
+    return bots
+
+
+async def server_metrics(host: str, port: int) -> Dict[str, Any]:
+    """Metrics collected by server"""
+    connection = Connection()
+    await connection.open(host, port)
+    try:
+        return await connection.request({"command": "get", "argument": "metrics"})
+    finally:
+        await connection.close()
+
+
+def main(argv: List[str] | None = None) -> None:
+    """Run load test and print report"""
+    parser = argparse.ArgumentParser(prog="python -m src.loadtest", description="Load test game server with bots")
+    parser.add_argument("--bots", type=int, default=200)
+    parser.add_argument("--room-size", type=int, default=4, help="bots per room, room starts when it is full")
+    parser.add_argument("--wpm", type=float, default=60, help="words per minute typed by each bot")
+    parser.add_argument("--time", type=int, default=20, help="game time in seconds")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5100)
+    args = parser.parse_args(argv)
+    if args.bots % args.room_size:  # last room would never fill up and start
+        parser.error("--bots must be a multiple of --room-size")
+
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "src.headless",
+            "--host", args.host, "--port", str(args.port), "--time", str(args.time),
+            "--auto-start", str(args.room_size), "--min-players", str(args.room_size), "--log-level", "WARNING",
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        asyncio.run(wait_listening(args.host, args.port))
+        start = time.perf_counter()
+        bots = asyncio.run(run_bots(args))
+        duration = time.perf_counter() - start
+        metrics = asyncio.run(server_metrics(args.host, args.port))
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait()
+    server_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    bots_usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    latencies = sorted(latency for bot in bots for latency in bot.latencies)
+    print("[loadtest]", f"{args.bots} bots in rooms of {args.room_size}, {args.wpm} wpm, {duration:.1f} s")
+    print("[loadtest]", f"attacks: {len(latencies)}, throughput: {len(latencies) / duration:.1f} commands/s")
+    print(
+        "[loadtest]",
+        "latency ms:",
+        ", ".join(
+            f"{name} {percentile(latencies, part) * 1000:.2f}"
+            for name, part in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+        ),
+    )
+    server_cpu = server_usage.ru_utime + server_usage.ru_stime
+    print("[loadtest]", f"server cpu: {server_cpu:.2f} s ({server_cpu / duration * 100:.1f}% of one core)")
+    print("[loadtest]", f"bots cpu: {bots_usage.ru_utime + bots_usage.ru_stime:.2f} s")
+    counters = metrics["counters"]
+    print("[loadtest]", f"server bytes in: {counters.get('bytes in', 0)}, out: {counters.get('bytes out', 0)}")
+    for name in ("handler attack", "game_loop batch", "tick", "map load"):
+        if name in metrics["histograms"]:
+            histogram = metrics["histograms"][name]
+            print(
+                "[loadtest]",
+                f"server {name} ms: p50 {histogram['p50_ms']:.2f}, p99 {histogram['p99_ms']:.2f}, "
+                f"max {histogram['max_ms']:.2f} ({histogram['count']} times)",
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+''' Logging setup for server processes '''
+
+import logging
+import time
+from typing import Dict, Tuple
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+RATE_LIMIT = 10  # records per second allowed for each message, repeated warnings are dropped above it
+RATE_BURST = 20  # records allowed at once before rate limit applies
+
+
+class RateLimitFilter(logging.Filter):
+    ''' Token bucket per message template, drops records above RATE_LIMIT and reports how many were dropped '''
+
+    def __init__(self, rate: float = RATE_LIMIT, burst: float = RATE_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[Tuple[str, str], Tuple[float, float, int]] = {}  # key -> tokens, last time, dropped
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        tokens, last, dropped = self.buckets.get(key, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now, dropped + 1)
+            return False
+        if dropped:
+            record.msg = f"{record.msg} ({dropped} similar messages dropped)"
+        self.buckets[key] = (tokens - 1, now, 0)
+        return True
+
+
+def setup_logging(level: str = "INFO") -> None:
+    ''' Log to stderr with given level, rate limited '''
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RateLimitFilter())
+    logging.basicConfig(level=level.upper(), handlers=[handler], force=True)
@@ -0,0 +1,103 @@
+''' On-disk library of generated maps
+
+Maps are keyed by (MAP_VERSION, players count, bounds, dense, seed) and stored as packed graph snapshots
+whose owners are player slots, so one map serves any nicknames. Map library can be filled ahead of time:
+
+Usage: python -m src.map_cache [--players 2 3 4] [--bounds 500 500] [--dense 3] [--dir map_cache] [--size 20]
+'''
+
+import argparse
+import os
+import random
+import re
+import tempfile
+from typing import List, Tuple
+
+from src.graph import Graph
+from src.server_config import DEFAULT_BOUNDS, DEFAULT_DENSE, MAP_CACHE_DIR, MAP_LIBRARY_SIZE
+
+SLOT_PREFIX = "\0slot"  # owner placeholder of stored maps, cannot appear in nickname typed by player
+MAP_VERSION = 2  # bump on any change of graph generation or snapshot format, older maps are then not used
+
+
+def map_name(players: int, bounds: Tuple[int, int], dense: int) -> str:
+    ''' File name prefix of maps with given settings '''
+    return f"v{MAP_VERSION}_p{players}_{bounds[0]}x{bounds[1]}_d{dense}_s"
+
+
+def map_path(directory: str, players: int, bounds: Tuple[int, int], dense: int, seed: int) -> str:
+    ''' Path of cached map '''
+    return os.path.join(directory, f"{map_name(players, bounds, dense)}{seed}.bin")
+
+
+def cached_seeds(directory: str, players: int, bounds: Tuple[int, int], dense: int) -> List[int]:
+    ''' Seeds of maps with given settings present in library '''
+    if not os.path.isdir(directory):
+        return []
+    pattern = re.compile(re.escape(map_name(players, bounds, dense)) + r"(\d+)\.bin")
+    return sorted(int(match.group(1)) for match in map(pattern.fullmatch, os.listdir(directory)) if match)
+
+
+def generate(directory: str, players: int, bounds: Tuple[int, int], dense: int, seed: int) -> bytes:
+    ''' Generate map with player slots as owners and store it in library '''
+    graph = Graph()
+    graph.generate([f"{SLOT_PREFIX}{i}" for i in range(players)], bounds, dense, seed)
+    data = graph.to_bytes()
+    os.makedirs(directory, exist_ok=True)
+    path = map_path(directory, players, bounds, dense, seed)
+    descriptor, temporary = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)  # readers never see partially written map
+    return data
+
+
+def load_or_generate(
+    directory: str | None, nicknames: List[str], bounds: Tuple[int, int], dense: int, seed: int
+) -> Graph:
+    ''' Graph for players from library, generated and stored if missing, directory None disables library '''
+    graph = Graph()
+    if directory is None:
+        graph.generate(nicknames, bounds, dense, seed)
+        return graph
+
+    path = map_path(directory, len(nicknames), bounds, dense, seed)
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        data = generate(directory, len(nicknames), bounds, dense, seed)
+    graph.from_bytes(data)
+    for i, nickname in enumerate(nicknames):
+        for vertex in list(graph.owned.get(f"{SLOT_PREFIX}{i}", ())):
+            graph.set_owner(vertex, nickname)
+    return graph
+
+
+def choose_seed(directory: str | None, library_size: int = MAP_LIBRARY_SIZE) -> int:
+    ''' Random seed, one of library_size library seeds if library is used so it stops growing once filled,
+    library_size 0 gives new map for every game '''
+    return random.randrange(library_size if directory is not None and library_size > 0 else 2**32)
+
+
+def main(argv: List[str] | None = None) -> None:
+    ''' Fill map library '''
+    parser = argparse.ArgumentParser(prog="python -m src.map_cache", description="Pre-generate maps")
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--bounds", type=int, nargs=2, metavar=("X", "Y"), default=list(DEFAULT_BOUNDS))
+    parser.add_argument("--dense", type=int, default=DEFAULT_DENSE)
+    parser.add_argument("--dir", default=MAP_CACHE_DIR)
+    parser.add_argument("--size", type=int, default=MAP_LIBRARY_SIZE, help="maps per settings")
+    args = parser.parse_args(argv)
+
+    bounds = tuple(args.bounds)
+    for players in args.players:
+        present = set(cached_seeds(args.dir, players, bounds, args.dense))
+        for seed in range(args.size):
+            if seed not in present:
+                generate(args.dir, players, bounds, args.dense, seed)
+        print("[map_cache]", f"{players} players: {args.size} maps in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+''' Server metrics: counters, maxima and latency histograms '''
+
+import bisect
+from typing import Any, Dict, List
+
+BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]  # seconds
+
+
+class Histogram:
+    ''' Count of observed durations per bucket, buckets are upper bounds in seconds '''
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)  # last one for durations above all buckets
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ''' Add one duration '''
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, part: float) -> float:
+        ''' Upper bound of bucket with given part of observations, max if above all buckets '''
+        if not self.count:
+            return 0.0
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= part * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        ''' Summary in milliseconds '''
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p90_ms": self.percentile(0.9) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+            "buckets": {f"{bound * 1000:g}ms": count for bound, count in zip(BUCKETS, self.counts)},
+        }
+
+
+class Metrics:
+    ''' Named counters, maxima and histograms, cheap enough to update on every message '''
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.maxima: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def count(self, name: str, value: int = 1) -> None:
+        ''' Increase counter '''
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def high(self, name: str, value: float) -> None:
+        ''' Remember highest value seen '''
+        if value > self.maxima.get(name, value - 1):
+            self.maxima[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        ''' Add duration to histogram '''
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ''' All metrics as JSON-friendly dict '''
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "maxima": dict(sorted(self.maxima.items())),
+            "histograms": {name: self.histograms[name].to_dict() for name in sorted(self.histograms)},
+        }
@@ -0,0 +1,112 @@
+""" Opt-in profiling: phase timers and cProfile capture
+
+Profiling is off unless enabled with PROFILE_ENV environment variable (or configure() called for command
+line flag) set to one of:
+- "timers": phases wrapped with timer() are measured, View draws per-frame timing overlay
+- "cprofile": timers and cProfile of each Session, written to PROFILE_DIR (or PROFILE_DIR_ENV) on its end
+
+Timers cost one function call when profiling is off.
+"""
+
+import contextlib
+import cProfile
+import os
+import time
+from typing import Any, Dict
+
+from src.metrics import Histogram
+
+PROFILE_ENV = "KEYBOARD_GAME_PROFILE"
+PROFILE_DIR_ENV = "KEYBOARD_GAME_PROFILE_DIR"
+PROFILE_DIR = "profiles"
+MODES = ("off", "timers", "cprofile")
+
+mode: str = "off"
+timers: Dict[str, Histogram] = {}  # phase name -> durations
+last: Dict[str, float] = {}  # phase name -> last duration in seconds
+
+NULL_TIMER = contextlib.nullcontext()
+
+
+def configure(new_mode: str | None) -> None:
+    """Set profiling mode, empty or "0" means off and "1" means timers"""
+    global mode
+    new_mode = (new_mode or "off").lower()
+    new_mode = {"0": "off", "1": "timers"}.get(new_mode, new_mode)
+    if new_mode not in MODES:
+        raise ValueError(f"unknown profiling mode {new_mode!r}, expected one of {', '.join(MODES)}")
+    mode = new_mode
+
+
+def enabled() -> bool:
+    """Whether phase timers are recorded"""
+    return mode != "off"
+
+
+class Timer:
+    """Context manager adding duration of its block to named phase"""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        duration = time.perf_counter() - self.start
+        histogram = timers.get(self.name)
+        if histogram is None:
+            histogram = timers[self.name] = Histogram()
+        histogram.observe(duration)
+        last[self.name] = duration
+
+
+def timer(name: str) -> contextlib.AbstractContextManager:
+    """Timer for named phase, shared no-op context manager if profiling is off"""
+    if mode == "off":
+        return NULL_TIMER
+    return Timer(name)
+
+
+def summary() -> Dict[str, Any]:
+    """Recorded phase durations"""
+    return {name: timers[name].to_dict() for name in sorted(timers)}
+
+
+class Session:
+    """Profiled part of program (server loop, view thread), with cProfile mode writes its profile on exit
+
+    cProfile sees only the thread the session was entered in.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.profiler: cProfile.Profile | None = None
+
+    def __enter__(self) -> "Session":
+        if mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.profiler is None:
+            return
+        self.profiler.disable()
+        directory = os.environ.get(PROFILE_DIR_ENV) or PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        self.profiler.dump_stats(f"{path}.prof")  # open with pstats or snakeviz
+        with open(f"{path}-timers.txt", "w", encoding="utf-8") as file:
+            for name, phase in summary().items():
+                file.write(
+                    f"{name}: count {phase['count']}, mean {phase['mean_ms']:.3f} ms, "
+                    f"p99 {phase['p99_ms']:.3f} ms, max {phase['max_ms']:.3f} ms\n"
+                )
+
+
+configure(os.environ.get(PROFILE_ENV))
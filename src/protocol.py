@@ -0,0 +1,55 @@
+""" Wire protocol module
+
+Every message is sent as a frame: 4-byte big-endian payload length followed by the utf-8 payload.
+"""
+
+import asyncio
+import struct
+
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # refuse frames bigger than 16 MiB
+
+
+class ProtocolError(Exception):
+    """Raised when peer sends malformed frame"""
+
+
+def pack(payload: str) -> bytes:
+    """Pack payload into frame"""
+    data = payload.encode()
+    if len(data) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"frame too big ({len(data)} bytes)")
+    return HEADER.pack(len(data)) + data
+
+
+async def read_payload(reader: asyncio.StreamReader) -> bytes | None:
+    """Read one frame payload as raw bytes, None if connection closed"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (size,) = HEADER.unpack(header)
+        if size > MAX_FRAME_SIZE:
+            raise ProtocolError(f"frame too big ({size} bytes)")
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def decode(payload: bytes) -> str:
+    """Decode utf-8 frame payload"""
+    try:
+        return payload.decode()
+    except UnicodeDecodeError as exc:
+        raise ProtocolError(f"frame is not utf-8 ({exc})") from exc
+
+
+async def read_frame(reader: asyncio.StreamReader) -> str | None:
+    """Read one frame payload, None if connection closed"""
+    payload = await read_payload(reader)
+    return None if payload is None else decode(payload)
+
+
+def write_frame(writer: asyncio.StreamWriter, payload: str) -> int:
+    """Write one frame, caller is responsible for drain, returns written bytes count"""
+    frame = pack(payload)
+    writer.write(frame)
+    return len(frame)
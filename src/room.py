@@ -0,0 +1,291 @@
+''' Game room module '''
+
+import asyncio
+import base64
+import json
+import logging
+from time import perf_counter
+from typing import Any, Dict, List, Set, Tuple
+
+from src import map_cache, profiling, protocol
+from src.graph import Graph
+from src.metrics import Metrics
+from src.server_config import MAP_LIBRARY_SIZE, TICK_RATE, WORDS_BUFFER, WORDS_LOW_WATERMARK
+from src.word_bank import WordBank
+
+logger = logging.getLogger(__name__)
+
+
+class Room:
+    ''' One independent game: its players, graph, legend and subscribers '''
+
+    def __init__(self, name: str, word_bank: WordBank, metrics: Metrics | None = None):
+        self.name = name
+        self.bounds: Tuple[int, int] = None
+        self.dense: int = None
+        self.time: int = None
+        self.seed: int = None  # map seed, same seed and players count replay same map
+        self.graph: Graph = None
+        self.players: List[str] = []
+        self.color_scheme: Dict[str, Tuple[int, int, int]] = {}
+        self.current_vertex: Dict[str, int] = {}  # nickname -> vertex_index
+        self.words_left: Dict[str, int] = {}  # nickname -> words client still has for current vertex
+        self.legend: Dict[str, int] = None
+        self.score_base: Dict[str, int] = {}  # nickname -> score settled at score_since
+        self.score_since: Dict[str, int] = {}  # nickname -> elapsed whole seconds when score was last settled
+        self.subscribers: Dict[str, asyncio.StreamWriter] = {}  # nickname -> updates connection
+
+        self.version: int = 0  # game state version, increased on each published delta
+        self.changed_vertices: Set[int] = set()
+        self.changed_legend: Set[str] = set()
+        self.acks: Dict[str, int] = {}  # nickname -> sequence number of last handled attack command
+        self.changed_acks: Set[str] = set()
+
+        self.started: bool = False  # game start requested, no more players may join
+        self.game_start_time: float = None  # also game running flag
+        self.client_updates: asyncio.Queue[Tuple[str, Dict[str, Any]]] = asyncio.Queue()  # nickname -> json query
+
+        self.word_bank = word_bank
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    async def run(
+        self,
+        bounds: Tuple[int, int],
+        dense: int,
+        time: int,
+        seed: int | None = None,
+        maps: str | None = None,
+        library_size: int = MAP_LIBRARY_SIZE,
+    ):
+        ''' Load map from maps library (generating it if missing) and play the game until time is over '''
+        self.bounds = bounds
+        self.dense = dense
+        self.time = time
+        self.seed = seed if seed is not None else map_cache.choose_seed(maps, library_size)
+        self.legend = self.get_legend()
+        logger.info(
+            "room %s: dense %s, bounds %s, time %s, seed %s, players %s",
+            self.name, self.dense, self.bounds, self.time, self.seed, self.players,
+        )
+
+        start = perf_counter()
+        self.graph = await asyncio.to_thread(  # do not stall other rooms while generating
+            map_cache.load_or_generate, maps, self.players, self.bounds, self.dense, self.seed
+        )
+        self.metrics.observe("map load", perf_counter() - start)
+        self.current_vertex = {player: self.graph.get_main(player) for player in self.players}
+        self.score_base = {player: 0 for player in self.players}
+        self.score_since = {player: 0 for player in self.players}
+
+        logger.info("game started in room %s", self.name)
+        self.game_start_time = asyncio.get_running_loop().time()
+
+        commands_task = asyncio.create_task(self.game_loop())
+        try:
+            await self.tick_loop()
+        finally:
+            commands_task.cancel()
+        logger.info("game finished in room %s", self.name)
+
+    async def tick_loop(self):
+        ''' Timer task updating time left and scores until game ends '''
+        loop = asyncio.get_running_loop()
+        interval = 1 / TICK_RATE
+        next_tick = self.game_start_time
+        while self.estimated_time() > 0:
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            start = perf_counter()
+            with profiling.timer("room tick"):
+                self.tick()
+            self.metrics.observe("tick", perf_counter() - start)
+
+    def tick(self):
+        ''' Per tick update of time left and scores accrued since last change of second '''
+        if self.estimated_time() != self.legend["time"]:
+            self.legend["time"] = self.estimated_time()
+            self.changed_legend.add("time")
+            logger.debug("room %s time left: %s", self.name, self.estimated_time())
+            for player in self.players:
+                score = self.score(player)
+                if score != self.legend[player]:
+                    self.legend[player] = score
+                    self.changed_legend.add(player)
+        if self.changed_vertices or self.changed_legend or self.changed_acks:
+            self.publish()
+
+    async def game_loop(self):
+        ''' Game loop, applies client commands as soon as they arrive '''
+        while True:
+            nickname, data = await self.client_updates.get()
+            start = perf_counter()
+            self.metrics.high("client_updates depth", self.client_updates.qsize() + 1)
+            with profiling.timer("room commands"):
+                self.try_command(nickname, data)
+                while not self.client_updates.empty():  # apply already queued commands in one batch
+                    self.try_command(*self.client_updates.get_nowait())
+
+            if self.changed_vertices or self.changed_legend or self.changed_acks:
+                with profiling.timer("room publish"):
+                    self.publish()
+            self.metrics.observe("game_loop batch", perf_counter() - start)
+
+    def try_command(self, nickname: str, data: Dict[str, Any]) -> None:
+        ''' Apply one client command, unexpected error is logged and command skipped so game loop keeps running '''
+        try:
+            self.handle_command(nickname, data)
+        except Exception:
+            logger.exception("command from player %s failed: %s", nickname, data)
+
+    def handle_command(self, nickname: str, data: Dict[str, Any]) -> None:
+        ''' Apply one client command to game state '''
+        if data.get("command") == "change":
+            try:
+                vertex_index = int(data.get("argument"))
+                assert vertex_index < len(self.graph.vertices)
+                assert vertex_index >= 0
+                assert self.graph.reachable(nickname, vertex_index)
+            except (ValueError, TypeError, AssertionError) as exc:
+                logger.warning("invalid change from player %s: %s, error: %s", nickname, data, exc)
+                return
+            self.current_vertex[nickname] = vertex_index
+            vertex_name = self.graph.vertices[vertex_index].name
+            logger.debug("player %s changed current to %s (%s)", nickname, vertex_name, vertex_index)
+            self.feed_words(nickname, reset=True)
+        elif data.get("command") == "attack":  # batch of count attacks, acknowledged by seq in next delta
+            if isinstance(data.get("seq"), int):
+                self.acks[nickname] = data["seq"]
+                self.changed_acks.add(nickname)
+            try:
+                vertex_index = int(data.get("argument"))
+                count = int(data.get("count", 1))
+                assert 1 <= count <= WORDS_BUFFER
+                assert vertex_index == self.current_vertex[nickname]
+                assert not self.graph.vertices[vertex_index].is_main
+            except (ValueError, TypeError, AssertionError) as exc:
+                logger.warning("invalid attack from player %s: %s, error: %s", nickname, data, exc)
+                return
+            for _ in range(count):
+                self.attack(nickname, vertex_index)
+
+    def attack(self, nickname: str, vertex_index: int) -> None:
+        ''' Apply one typed word to vertex: heal own one, damage and maybe capture other one '''
+        vertex_name = self.graph.vertices[vertex_index].name
+        self.words_left[nickname] = self.words_left.get(nickname, 0) - 1
+        if self.words_left[nickname] < WORDS_LOW_WATERMARK:
+            self.feed_words(nickname)
+
+        if self.graph.vertices[vertex_index].owner == nickname:
+            self.graph.vertices[vertex_index].hp += 1
+            self.changed_vertices.add(vertex_index)
+            logger.debug("player %s healed vertex %s (%s)", nickname, vertex_name, vertex_index)
+        else:
+            self.graph.vertices[vertex_index].hp -= 1
+            self.changed_vertices.add(vertex_index)
+            logger.debug("player %s attacked vertex %s (%s)", nickname, vertex_name, vertex_index)
+            if self.graph.vertices[vertex_index].hp == 0:
+                self.graph.vertices[vertex_index].hp = 3
+                old_owner = self.graph.vertices[vertex_index].owner
+                self.settle_score(nickname)
+                if old_owner is not None:
+                    self.settle_score(old_owner)
+                self.graph.set_owner(vertex_index, nickname)
+                logger.debug("player %s captured vertex %s (%s)", nickname, vertex_name, vertex_index)
+
+                if old_owner is not None:  # check if old owner needs to force change vertex
+                    if not self.graph.reachable(old_owner, self.current_vertex[old_owner]):
+                        self.current_vertex[old_owner] = vertex_index  # move to captured vertex
+                        logger.debug("player %s forced to change vertex", old_owner)
+                        self.feed_words(old_owner, reset=True)
+
+    def feed_words(self, nickname: str, reset: bool = False) -> None:
+        ''' Push words for current vertex to player, topping up buffer to WORDS_BUFFER '''
+        vertex_index = self.current_vertex[nickname]
+        if reset:
+            self.words_left[nickname] = 0
+        words = []
+        if not self.graph.vertices[vertex_index].is_main:  # no words on main vertex
+            words = self.word_bank.sample(
+                self.graph.vertices[vertex_index].size // 2 + 2, WORDS_BUFFER - max(0, self.words_left[nickname])
+            )
+        self.words_left[nickname] = max(0, self.words_left[nickname]) + len(words)
+        message = {"type": "words", "vertex": vertex_index, "reset": reset, "words": " ".join(words)}
+        self.send_to(nickname, json.dumps(message))
+
+    def send_to(self, nickname: str, message: str) -> None:
+        ''' Send message to one subscriber if connected '''
+        writer = self.subscribers.get(nickname)
+        if writer is not None and not writer.is_closing():
+            self.metrics.count("bytes out", protocol.write_frame(writer, message))
+
+    def publish(self) -> None:
+        ''' Publish changed vertices and legend entries to subscribers '''
+        self.version += 1
+        delta = {
+            "type": "delta",
+            "version": self.version,
+            "vertices": {
+                index: {"owner": self.graph.vertices[index].owner, "hp": self.graph.vertices[index].hp}
+                for index in self.changed_vertices
+            },
+            "legend": {key: self.legend[key] for key in self.changed_legend},
+            "acks": {nickname: self.acks[nickname] for nickname in self.changed_acks},
+        }
+        self.changed_vertices.clear()
+        self.changed_legend.clear()
+        self.changed_acks.clear()
+        self.metrics.count("deltas")
+        if self.subscribers:
+            with profiling.timer("room encode delta"):
+                message = json.dumps(delta)
+            self.broadcast(message)
+
+    def broadcast(self, message: str) -> None:
+        ''' Send message to all subscribers, frame is packed once for all of them '''
+        frame = protocol.pack(message)
+        for writer in self.subscribers.values():
+            if not writer.is_closing():
+                writer.write(frame)
+                self.metrics.count("bytes out", len(frame))
+
+    def snapshot(self) -> str:
+        ''' Full game state for (re)subscribing client '''
+        return json.dumps(
+            {
+                "type": "snapshot",
+                "version": self.version,
+                "graph": base64.b64encode(self.graph.to_bytes()).decode(),
+                "legend": self.legend,
+                "acks": self.acks,
+            }
+        )
+
+    def estimated_time(self) -> int:
+        ''' Estimated time to end game '''
+        return self.time - int(asyncio.get_event_loop().time() - self.game_start_time)
+
+    def elapsed_seconds(self) -> int:
+        ''' Whole seconds of game passed, capped by game time '''
+        return min(self.time, self.time - self.estimated_time())
+
+    def score(self, player: str) -> int:
+        ''' Player score: settled part plus one point per owned vertex for each second since it was settled '''
+        return self.score_base[player] + self.graph.count(player) * (self.elapsed_seconds() - self.score_since[player])
+
+    def settle_score(self, player: str) -> None:
+        ''' Fix score accrued so far, must be called before player's vertex count changes '''
+        self.score_base[player] = self.score(player)
+        self.score_since[player] = self.elapsed_seconds()
+
+    def get_legend(self) -> Dict[str, int]:
+        ''' Get legend '''
+        legend = {
+            "time": self.time,
+        }
+        for player in self.players:
+            legend[player] = 0
+        return legend
+
+    def get_words(self, size: int) -> List[str]:
+        ''' Get 50 words '''
+        return self.word_bank.sample(size // 2 + 2, 50)
@@ -2,298 +2,315 @@
 
 import asyncio
 import json
-import os
-import random
-import threading
-from typing import Any, Dict, List, Set, Tuple
-
-import tkinter as tk
-from tkinter import messagebox
-
-from src.graph import Graph
-from src.server_config import HOST, PORT
+import logging
+from time import perf_counter
+from typing import Any, Dict, Set, Tuple
+
+from src import profiling, protocol, snapshot
+from src.metrics import Metrics
+from src.room import Room
+from src.server_config import (
+    DEFAULT_BOUNDS,
+    DEFAULT_DENSE,
+    DEFAULT_ROOM,
+    DEFAULT_TIME,
+    HOST,
+    MAP_CACHE_DIR,
+    MAP_LIBRARY_SIZE,
+    MAX_NICKNAME_LENGTH,
+    MAX_ROOM_NAME_LENGTH,
+    MIN_PLAYERS,
+    PORT,
+)
+from src.word_bank import WordBank
+
+COMMANDS = {"connect", "subscribe", "start", "get", "change", "attack"}  # known commands counted by name in metrics
+GET_ARGUMENTS = {"state", "metrics", "graph", "legend", "color_scheme", "words"}
+
+logger = logging.getLogger(__name__)
+
+
+def command_label(data: Dict[str, Any]) -> str:
+    ''' Name of request in metrics, unknown commands share one name to keep metrics bounded '''
+    command = data.get("command")
+    if command == "get":
+        return f"get {data.get('argument')}" if data.get("argument") in GET_ARGUMENTS else "get other"
+    return command if command in COMMANDS else "other"
+
+
+def valid_nickname(nickname: Any) -> bool:
+    ''' Nickname is non-empty printable string not longer than client allows '''
+    return isinstance(nickname, str) and 0 < len(nickname) <= MAX_NICKNAME_LENGTH and nickname.isprintable()
 
 
 class Server:
-    ''' Game server class '''
-
-    def __init__(self):
-        self.bounds: Tuple[int, int] = None
-        self.dense: int = None
-        self.time: int = None
-        self.graph: Graph = None
-        self.players: List[str] = []
-        self.color_scheme: Dict[str, Tuple[int, int, int]] = {}
-        self.current_vertex: Dict[str, int] = {}  # nickname -> vertex_index
-        self.legend: Dict[str, int] = None
-
-        self.port = PORT
-        self.host = HOST
+    ''' Game server class, hosts many independent game rooms on one port '''
+
+    def __init__(
+        self,
+        host: str = HOST,
+        port: int = PORT,
+        bounds: Tuple[int, int] = DEFAULT_BOUNDS,
+        dense: int = DEFAULT_DENSE,
+        time: int = DEFAULT_TIME,
+        min_players: int = MIN_PLAYERS,
+        auto_start: int | None = None,
+        seed: int | None = None,
+        maps: str | None = MAP_CACHE_DIR,
+        map_library_size: int = MAP_LIBRARY_SIZE,
+    ):
+        self.bounds = bounds  # settings for automatically started rooms and default room chosen in menu
+        self.dense = dense
+        self.time = time
+        self.min_players = min_players  # players needed to start game
+        self.auto_start = auto_start  # start room game as soon as this many players joined
+        self.seed = seed  # map seed for every game, random cached map if None
+        self.maps = maps  # map library directory, None to always generate maps
+        self.map_library_size = map_library_size  # random maps per settings, 0 for new map every game
+
+        self.port = port
+        self.host = host
         self.server: asyncio.AbstractServer = None
         self.is_serving: bool = False
         self.active_connections: Set[asyncio.StreamWriter] = set()
-        self.players_address: Dict[Tuple[str, int], str] = {}  # address -> nickname
+        self.handlers: Set[asyncio.Task] = set()  # running handle_update tasks
+        self.players_address: Dict[Tuple[str, int], Tuple[Room, str]] = {}  # address -> room and nickname
 
-        self.game_start_time: float = None  # also game started flag
-        self.client_updates: asyncio.Queue[Tuple[str, Dict[str, Any]]] = asyncio.Queue()  # nickname -> json query
-        self.start_clicked: bool = False
-
-        self.words: Dict[int, List[str]] = {}
-        with open(os.path.join("src", "data", "words.txt"), "r", encoding='utf-8') as file:
-            for line in file:
-                word = line
-                size = len(word)
-                if size not in self.words:
-                    self.words[size] = []
-                self.words[size].append(word)
+        self.word_bank = WordBank()
+        self.metrics = Metrics()
+        self.rooms: Dict[str, Room] = {DEFAULT_ROOM: Room(DEFAULT_ROOM, self.word_bank, self.metrics)}  # name -> room
+        self.games: Set[asyncio.Task] = set()  # running room games
 
     async def run(self):
-        ''' Run server logic '''
-        server_thread = threading.Thread(target=lambda: asyncio.run(self.start_server()))
-        server_thread.start()
-
-        await self.run_menu()
-        self.legend: Dict[str, int] = self.get_legend()
-        print("[main]", "dense:", self.dense, "bounds:", self.bounds, "time:", self.time)
-        print("[main]", "players:", self.players, "color_scheme:", self.color_scheme)
-        print("[main]", "legend:", self.legend, "players_address:", self.players_address)
-
-        self.graph = Graph()
-        self.graph.generate(self.players, self.bounds, self.dense)
-        self.current_vertex = {player: self.graph.get_main(player) for player in self.players}
-
-        print("[main]", "game started")
-        self.game_start_time = asyncio.get_event_loop().time()
-
-        while self.estimated_time() > 0:
-            await self.game_loop()
-
-        self.is_serving = False
-        server_thread.join()
-
-    async def game_loop(self):
-        ''' Game loop '''
-        if self.estimated_time() != self.legend["time"]:
-            self.legend["time"] = self.estimated_time()
-            print("[game]", "time left:", self.estimated_time())
-            for player in self.players:
-                self.legend[player] += self.graph.count(player)
-
-        while self.client_updates.qsize() > 0:
-            nickname, data = await self.client_updates.get()
-
-            if data.get("command") == "change":
-                try:
-                    vertex_index = int(data.get("argument"))
-                    assert vertex_index < len(self.graph.vertices)
-                    assert vertex_index >= 0
-                    assert self.graph.reachable(nickname, vertex_index)
-                except (ValueError, AssertionError) as exc:
-                    print("[game]", f"invalid change from player {nickname}: {data}\nerror: {exc}")
-                    continue
-                self.current_vertex[nickname] = vertex_index
-                vertex_name = self.graph.vertices[vertex_index].name
-                print("[game]", f"player {nickname} changed current to {vertex_name} ({vertex_index})")
-            elif data.get("command") == "attack":
-                try:
-                    vertex_index = int(data.get("argument"))
-                    assert vertex_index == self.current_vertex[nickname]
-                    assert not self.graph.vertices[vertex_index].is_main
-                except (ValueError, AssertionError) as exc:
-                    print("[game]", f"invalid attack from player {nickname}: {data}\nerror: {exc}")
-                    continue
-                vertex_name = self.graph.vertices[vertex_index].name
-
-                if self.graph.vertices[vertex_index].owner is nickname:
-                    self.graph.vertices[vertex_index].hp += 1
-                    print("[game]", f"player {nickname} healed vertex {vertex_name} ({vertex_index})")
-                else:
-                    self.graph.vertices[vertex_index].hp -= 1
-                    print("[game]", f"player {nickname} attacked vertex {vertex_name} ({vertex_index})")
-                    if self.graph.vertices[vertex_index].hp == 0:
-                        self.graph.vertices[vertex_index].hp = 3
-                        old_owner = self.graph.vertices[vertex_index].owner
-                        self.graph.vertices[vertex_index].owner = nickname
-                        print("[game]", f"player {nickname} captured vertex {vertex_name} ({vertex_index})")
-
-                        if old_owner is not None:  # check if old owner needs to force change vertex
-                            if not self.graph.reachable(old_owner, self.current_vertex[old_owner]):
-                                self.current_vertex[old_owner] = vertex_index  # move to captured vertex
-                                print("[game]", f"player {old_owner} forced to change vertex")
-
-    def estimated_time(self) -> int:
-        ''' Estimated time to end game '''
-        return self.time - int(asyncio.get_event_loop().time() - self.game_start_time)
+        ''' Run headless server until cancelled, games are started by players or automatically '''
+        await self.start_server()
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop_server()
+
+    def start_room(self, room: Room, bounds: Tuple[int, int], dense: int, time: int, seed: int | None = None) -> None:
+        ''' Start game in room, room is freed when game ends '''
+        room.started = True
+        seed = self.seed if seed is None else seed
+        game = asyncio.create_task(room.run(bounds, dense, time, seed, self.maps, self.map_library_size))
+        self.games.add(game)
+
+        def finish(task: asyncio.Task) -> None:
+            self.games.discard(task)
+            if self.rooms.get(room.name) is room:
+                del self.rooms[room.name]
+            if not task.cancelled() and task.exception() is not None:
+                logger.error("game in room %s failed", room.name, exc_info=task.exception())
+                for connection in list(self.active_connections):  # do not leave players waiting for game
+                    address = connection.get_extra_info('peername')
+                    if address in self.players_address and self.players_address[address][0] is room:
+                        connection.close()
+
+        game.add_done_callback(finish)
 
     async def start_server(self):
         ''' Start server listening '''
         self.is_serving = True
         self.server = await asyncio.start_server(self.handle_update, self.host, self.port)
-        print("[server] started on port", self.port)
+        logger.info("started on port %s", self.port)
 
-        while self.is_serving:
-            await asyncio.sleep(0.1)
+    async def stop_server(self):
+        ''' Stop listening and close all connections '''
+        self.is_serving = False
         self.server.close()
-
-        for connection in self.active_connections:
+        for game in self.games:
+            game.cancel()
+        for connection in list(self.active_connections):
             connection.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
         await self.server.wait_closed()
-        print("[server] server closed")
+        logger.info("server closed")
 
     async def handle_update(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         ''' Handle client connections '''
         self.active_connections.add(writer)
+        self.handlers.add(asyncio.current_task())
+        addr: Tuple[str, int] = writer.get_extra_info('peername')
 
-        while self.is_serving:
-            raw_data = await reader.read(1024)
-            if not raw_data:
-                await asyncio.sleep(0.2)
-                continue
-            addr: Tuple[str, int] = writer.get_extra_info('peername')
-            print("[handler]", f"get {raw_data} from {addr}")
-
-            data: Dict[str, Any]
-            try:
-                data = json.loads(raw_data.decode())
-            except json.JSONDecodeError:
-                print("[handler]", "invalid data recieved")
-                writer.write("invalid".encode())
-                await writer.drain()
-                continue
-
-            if data.get("command") == "get" and data.get("argument") == "state":
-                print("[handler]", "state query", bool(self.game_start_time))
-                if self.game_start_time:
-                    writer.write("game started".encode())
-                else:
-                    writer.write("game not started".encode())
-                await writer.drain()
-                continue
-            elif data.get("command") == "connect" and not self.game_start_time:
-                if data.get("nickname") in self.players:
-                    print("[handler]", "nickname exists")
-                    writer.write("nickname exists".encode())
-                    await writer.drain()
+        try:
+            while self.is_serving:
+                try:
+                    payload = await protocol.read_payload(reader)
+                    if payload is None:  # connection closed by client
+                        break
+                    self.metrics.count("bytes in", protocol.HEADER.size + len(payload))
+                    raw_data = protocol.decode(payload)
+                except (protocol.ProtocolError, ConnectionError) as exc:
+                    logger.info("connection dropped: %s", exc)
+                    break
+                logger.debug("get %s from %s", raw_data, addr)
+
+                data: Dict[str, Any]
+                try:
+                    with profiling.timer("server decode"):
+                        data = json.loads(raw_data)
+                    assert isinstance(data, dict)
+                except (json.JSONDecodeError, AssertionError):
+                    logger.warning("invalid data recieved from %s", addr)
+                    self.metrics.count("commands invalid")
+                    await self.reply(writer, {}, "invalid")
                     continue
-                print("[handler]", "new player", data.get("nickname"))
-                self.players.append(data.get("nickname"))
-                self.color_scheme[data.get("nickname")] = tuple(data.get("color"))
-                self.players_address[addr] = data.get("nickname")
-                writer.write("connected".encode())
-                await writer.drain()
-                continue
-
-            if addr not in self.players_address:
-                print("[handler]", "unknown player query")
-                writer.write("unknown".encode())
-                await writer.drain()
-                continue
-
-            nickname = self.players_address[addr]
-            if data.get("command") == "get":
-                argument = data.get("argument")
-                if argument == "graph":
-                    response = json.dumps(self.graph.to_dict())
-                elif argument == "legend":
-                    response = json.dumps(self.legend)
-                elif argument == "color_scheme":
-                    response = json.dumps(self.color_scheme)
-                elif argument == "words":
-                    if self.graph.vertices[self.current_vertex[nickname]].is_main:
-                        response = "no words on main vertex"
-                    else:
-                        response = self.get_words(self.graph.vertices[self.current_vertex[nickname]].size)
-                else:
-                    response = "invalid"
-                    print("[handler]", "invalid get query from", nickname)
-                print("[handler]", "get query from", nickname)
-                writer.write(response.encode())
-                await writer.drain()
-                continue
-            print("[handler]", f"'{data.get("command")}' query from {nickname}")
-            await self.client_updates.put((nickname, data))
-            writer.write("recieved".encode())
-            await writer.drain()
-
-    async def run_menu(self) -> None:
-        ''' Run menu '''
-        root = tk.Tk()
-        root.title("Server menu")
-        root.geometry("500x300")
-        root.resizable(False, False)
 
-        bounds_label = tk.Label(root, text="Bounds:")
-        bounds_label.pack()
-        x_label = tk.Label(root, text="X:")
-        x_label.pack()
-        x_entry = tk.Entry(root, width=20)
-        x_entry.insert(0, "500")
-        x_entry.pack()
-        y_label = tk.Label(root, text="Y:")
-        y_label.pack()
-        y_entry = tk.Entry(root, width=20)
-        y_entry.insert(0, "500")
-        y_entry.pack()
-
-        dense_label = tk.Label(root, text="Density (there will dense*(players+1) vertices in graph):")
-        dense_label.pack()
-        dense_entry = tk.Entry(root, width=20)
-        dense_entry.pack()
-        dense_entry.insert(0, "3")
-
-        time_label = tk.Label(root, text="Game time (seconds):")
-        time_label.pack()
-        time_entry = tk.Entry(root, width=20)
-        time_entry.insert(0, "300")
-        time_entry.pack()
-
-        def start():
-            if not x_entry.get() or not y_entry.get() or not dense_entry.get() or not time_entry.get():
-                messagebox.showerror("Error", "Fill all fields")
+                label = command_label(data)
+                self.metrics.count(f"commands {label}")
+                start = perf_counter()
+                with profiling.timer("server request"):
+                    await self.handle_request(writer, addr, data)
+                self.metrics.observe(f"handler {label}", perf_counter() - start)
+        finally:
+            self.active_connections.discard(writer)
+            self.handlers.discard(asyncio.current_task())
+            if addr in self.players_address:
+                room, nickname = self.players_address.pop(addr)
+                if room.subscribers.get(nickname) is writer:
+                    del room.subscribers[nickname]
+                if not room.started:  # left before game, free nickname and room if it became empty
+                    room.players.remove(nickname)
+                    del room.color_scheme[nickname]
+                    if not room.players and room.name != DEFAULT_ROOM and self.rooms.get(room.name) is room:
+                        del self.rooms[room.name]
+            writer.close()
+
+    async def handle_request(self, writer: asyncio.StreamWriter, addr: Tuple[str, int], data: Dict[str, Any]):
+        ''' Handle one client request '''
+        if data.get("command") == "get" and data.get("argument") == "metrics":  # allowed without joining
+            await self.reply(writer, data, self.get_metrics())
+            return
+        if data.get("command") == "get" and data.get("argument") == "state":
+            room = self.players_address[addr][0] if addr in self.players_address else None
+            if room is None:
+                room = self.rooms.get(str(data.get("room", DEFAULT_ROOM)))
+            logger.debug("state query %s", bool(room and room.game_start_time))
+            if room is not None and room.game_start_time:
+                await self.reply(writer, data, "game started")
+            else:
+                await self.reply(writer, data, "game not started")
+            return
+        elif data.get("command") == "connect" and addr not in self.players_address:
+            room_name = str(data.get("room", DEFAULT_ROOM))
+            color = data.get("color")
+            if (
+                not valid_nickname(data.get("nickname"))
+                or not isinstance(color, list)
+                or len(color) != 3
+                or not 0 < len(room_name) <= MAX_ROOM_NAME_LENGTH
+            ):
+                logger.warning("invalid connect from %s: %s", addr, data)
+                await self.reply(writer, data, "invalid")
                 return
-            if len(self.players) == 0:
-                messagebox.showerror("Error", "At least one player needed")
+            room = self.rooms.get(room_name)
+            if room is not None and room.started:
+                await self.reply(writer, data, "game already started")
                 return
-            self.bounds = (int(x_entry.get()), int(y_entry.get()))
-            self.dense = int(dense_entry.get())
-            self.time = int(time_entry.get())
-            self.start_clicked = True
-            root.destroy()
-
-        connect_button = tk.Button(root, text="Start game", command=start)
-        connect_button.pack()
-
-        divider = tk.Frame(root, height=2, bd=1, relief=tk.SUNKEN)
-        divider.pack(fill=tk.X, padx=5, pady=5)
-
-        address_label = tk.Label(root, text=f"Address: {self.host}:{self.port}")
-        address_label.pack()
-
-        players_label = tk.Label(root, text=f"{self.players}")
-        players_label.pack()
-
-        def update_players():
-            players_label.config(text=f"{self.players}")
-            if not self.start_clicked:
-                root.after(1000, update_players)
-
-        update_players()
-        root.mainloop()
-
-    def get_legend(self) -> Dict[str, int]:
-        ''' Get legend '''
-        legend = {
-            "time": self.time,
+            if room is not None and data.get("nickname") in room.players:
+                logger.info("nickname exists")
+                await self.reply(writer, data, "nickname exists")
+                return
+            if room is None:  # created only for player who joins it, so it is freed when last player leaves
+                room = self.rooms[room_name] = Room(room_name, self.word_bank, self.metrics)
+            logger.info("new player %s in room %s", data.get("nickname"), room_name)
+            room.players.append(data.get("nickname"))
+            room.color_scheme[data.get("nickname")] = tuple(color)
+            self.players_address[addr] = (room, data.get("nickname"))
+            await self.reply(writer, data, "connected")
+            if self.auto_start and len(room.players) >= self.auto_start:
+                self.start_room(room, self.bounds, self.dense, self.time)
+            return
+
+        if addr not in self.players_address:
+            logger.warning("unknown player query from %s", addr)
+            await self.reply(writer, data, "unknown")
+            return
+
+        room, nickname = self.players_address[addr]
+        if data.get("command") == "subscribe":  # pushed updates go to this connection, starting with snapshot
+            if not room.game_start_time:
+                await self.reply(writer, data, "unknown")
+                return
+            logger.info("subscribe from %s", nickname)
+            room.subscribers[nickname] = writer
+            self.metrics.count("bytes out", protocol.write_frame(writer, room.snapshot()))
+            await self.reply(writer, data, "subscribed")
+            return
+        if data.get("command") == "start":  # any player of room may start its game
+            if room.started:
+                await self.reply(writer, data, "game already started")
+                return
+            if len(room.players) < self.min_players:
+                await self.reply(writer, data, "not enough players")
+                return
+            try:
+                bounds = tuple(map(int, data.get("bounds", DEFAULT_BOUNDS)))
+                dense = int(data.get("dense", DEFAULT_DENSE))
+                time = int(data.get("time", DEFAULT_TIME))
+                seed = None if data.get("seed") is None else int(data["seed"])
+                assert len(bounds) == 2 and min(bounds) > 0 and dense > 0 and time > 0
+                assert max(bounds) <= snapshot.MAX_FIELD and dense <= snapshot.MAX_FIELD  # must fit snapshot header
+            except (ValueError, TypeError, AssertionError) as exc:
+                logger.warning("invalid start from player %s: %s, error: %s", nickname, data, exc)
+                await self.reply(writer, data, "invalid")
+                return
+            logger.info("start from %s in room %s", nickname, room.name)
+            self.start_room(room, bounds, dense, time, seed)
+            await self.reply(writer, data, "started")
+            return
+        if data.get("command") == "get":
+            argument = data.get("argument")
+            response: Any
+            if room.graph is None and argument in ("graph", "legend", "words"):  # map is not loaded yet
+                await self.reply(writer, data, "game not started")
+                return
+            if argument == "graph":
+                response = room.graph.to_dict()
+            elif argument == "legend":
+                response = room.legend
+            elif argument == "color_scheme":
+                response = room.color_scheme
+            elif argument == "words":
+                if room.graph.vertices[room.current_vertex[nickname]].is_main:
+                    response = "no words on main vertex"
+                else:
+                    response = room.get_words(room.graph.vertices[room.current_vertex[nickname]].size)
+            else:
+                response = "invalid"
+                logger.warning("invalid get query from %s", nickname)
+            logger.debug("get query from %s", nickname)
+            await self.reply(writer, data, response)
+            return
+        if not room.game_start_time:
+            await self.reply(writer, data, "game not started")
+            return
+        logger.debug("'%s' query from %s", data.get("command"), nickname)
+        await room.client_updates.put((nickname, data))
+        await self.reply(writer, data, "recieved")
+
+    async def reply(self, writer: asyncio.StreamWriter, request: Dict[str, Any], response: Any) -> None:
+        ''' Send response, wrapped with request id if client sent one '''
+        if "id" in request:
+            payload = json.dumps({"id": request["id"], "response": response})
+        else:
+            payload = response if isinstance(response, str) else json.dumps(response)
+        self.metrics.count("bytes out", protocol.write_frame(writer, payload))
+        await writer.drain()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        ''' Collected metrics with current connections, rooms and queues state, and phase timers if profiling '''
+        return {
+            **self.metrics.to_dict(),
+            **({"profile": profiling.summary()} if profiling.enabled() else {}),
+            "current": {
+                "connections": len(self.active_connections),
+                "rooms": len(self.rooms),
+                "games": len(self.games),
+                "subscribers": sum(len(room.subscribers) for room in self.rooms.values()),
+                "client_updates": sum(room.client_updates.qsize() for room in self.rooms.values()),
+            },
         }
-        for player in self.players:
-            legend[player] = 0
-        return legend
-
-    def get_words(self, size: int) -> str:
-        ''' Get 50 words '''
-        words_length = size // 2 + 3
-        words_count = min(50, len(self.words[words_length]))
-        words = random.sample(self.words[words_length], words_count)
-        random.shuffle(words)
-        words = [word.rstrip('\n') for word in words]
-        return str(words)
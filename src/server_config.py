@@ -5,3 +5,15 @@ import random
 
 HOST = "127.0.0.1"
 PORT = random.randrange(10000, 60000)
+TICK_RATE = 4  # game timer ticks per second, scores are still awarded once per second
+WORDS_BUFFER = 50  # words pushed to player for current vertex
+WORDS_LOW_WATERMARK = 20  # refill player words when fewer left
+DEFAULT_ROOM = "default"  # room for clients not asking for specific one
+MAX_NICKNAME_LENGTH = 14
+MAX_ROOM_NAME_LENGTH = 32
+DEFAULT_BOUNDS = (500, 500)  # game settings used when start command omits them
+DEFAULT_DENSE = 3
+DEFAULT_TIME = 300
+MIN_PLAYERS = 1  # players needed in room to start its game
+MAP_CACHE_DIR = "map_cache"  # library of generated maps
+MAP_LIBRARY_SIZE = 20  # default random maps per settings (seeds 0..N-1), so library stops growing once filled
@@ -0,0 +1,104 @@
+''' Server with Tk menu for configuring and starting default room '''
+
+import asyncio
+
+import tkinter as tk
+from tkinter import messagebox
+
+from src.server import Server
+from src.server_config import DEFAULT_ROOM
+
+
+class MenuServer(Server):
+    ''' Server hosting one game configured in menu, stops when started games are over '''
+
+    def __init__(self):
+        super().__init__()
+        self.start_clicked: bool = False
+
+    async def run(self):
+        ''' Run server logic '''
+        await self.start_server()
+
+        await self.run_menu()
+        if not self.start_clicked:  # menu closed without starting the game
+            await self.stop_server()
+            return
+        room = self.rooms.get(DEFAULT_ROOM)
+        if room is not None and not room.started:  # players may have started it themselves meanwhile
+            self.start_room(room, self.bounds, self.dense, self.time)
+        while self.games:  # serve until every started game is over
+            await asyncio.gather(*self.games, return_exceptions=True)
+
+        await self.stop_server()
+
+    async def run_menu(self) -> None:
+        ''' Run menu configuring default room '''
+        room = self.rooms[DEFAULT_ROOM]
+        root = tk.Tk()
+        root.title("Server menu")
+        root.geometry("500x300")
+        root.resizable(False, False)
+
+        bounds_label = tk.Label(root, text="Bounds:")
+        bounds_label.pack()
+        x_label = tk.Label(root, text="X:")
+        x_label.pack()
+        x_entry = tk.Entry(root, width=20)
+        x_entry.insert(0, "500")
+        x_entry.pack()
+        y_label = tk.Label(root, text="Y:")
+        y_label.pack()
+        y_entry = tk.Entry(root, width=20)
+        y_entry.insert(0, "500")
+        y_entry.pack()
+
+        dense_label = tk.Label(root, text="Density (there will dense*(players+1) vertices in graph):")
+        dense_label.pack()
+        dense_entry = tk.Entry(root, width=20)
+        dense_entry.pack()
+        dense_entry.insert(0, "3")
+
+        time_label = tk.Label(root, text="Game time (seconds):")
+        time_label.pack()
+        time_entry = tk.Entry(root, width=20)
+        time_entry.insert(0, "300")
+        time_entry.pack()
+
+        def start():
+            if not x_entry.get() or not y_entry.get() or not dense_entry.get() or not time_entry.get():
+                messagebox.showerror("Error", "Fill all fields")
+                return
+            if len(room.players) < self.min_players:
+                messagebox.showerror("Error", f"At least {self.min_players} players needed")
+                return
+            self.bounds = (int(x_entry.get()), int(y_entry.get()))
+            self.dense = int(dense_entry.get())
+            self.time = int(time_entry.get())
+            self.start_clicked = True
+            root.destroy()
+
+        connect_button = tk.Button(root, text="Start game", command=start)
+        connect_button.pack()
+
+        divider = tk.Frame(root, height=2, bd=1, relief=tk.SUNKEN)
+        divider.pack(fill=tk.X, padx=5, pady=5)
+
+        address_label = tk.Label(root, text=f"Address: {self.host}:{self.port}")
+        address_label.pack()
+
+        players_label = tk.Label(root, text=f"{room.players}")
+        players_label.pack()
+
+        def update_players():
+            players_label.config(text=f"{room.players}")
+            if not self.start_clicked:
+                root.after(1000, update_players)
+
+        update_players()
+        while not self.start_clicked:  # pump tk events without blocking connection handlers
+            try:
+                root.update()
+            except tk.TclError:  # window closed
+                break
+            await asyncio.sleep(0.05)
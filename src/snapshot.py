@@ -0,0 +1,113 @@
+""" Compact binary graph snapshot codec
+
+Layout of packed snapshot:
+- header (layout checksum, bounds, dense, vertices/edges count, names size)
+- layout part, same for whole game: x, y, size, main flag columns, flat edges array, newline separated names
+- state part: player table (count, then length-prefixed names), hp column, owner column (0 for no owner,
+  player index + 1 otherwise)
+
+All columns are little-endian arrays, so a client that already has the layout only reads the state part.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, List
+
+from src.vertex import Vertex
+
+HEADER = struct.Struct("<IHHHIII")  # layout checksum, bounds x, bounds y, dense, vertices, edges, names size
+PLAYERS_COUNT = struct.Struct("<H")
+NAME_SIZE = struct.Struct("<H")  # player name length prefix, names may hold any characters
+MAX_FIELD = 0xFFFF  # largest bounds and dense (coordinates lie within bounds) the uint16 fields can hold
+
+
+def _column(typecode: str, values) -> bytes:
+    """Pack values into little-endian array bytes"""
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(typecode: str, data: bytes, offset: int, count: int) -> array:
+    """Read count little-endian values starting at offset"""
+    column = array(typecode)
+    column.frombytes(data[offset : offset + count * column.itemsize])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def pack(graph) -> bytes:
+    """Pack graph into snapshot bytes"""
+    vertices = graph.vertices
+    names = "\n".join(vertex.name for vertex in vertices).encode()
+    layout = b"".join(
+        (
+            _column("H", (vertex.x for vertex in vertices)),
+            _column("H", (vertex.y for vertex in vertices)),
+            _column("B", (vertex.size for vertex in vertices)),
+            _column("B", (vertex.is_main for vertex in vertices)),
+            _column("I", (index for edge in graph.edges for index in edge)),
+            names,
+        )
+    )
+
+    players: List[str] = list(dict.fromkeys(vertex.owner for vertex in vertices if vertex.owner is not None))
+    player_ids = {player: i + 1 for i, player in enumerate(players)}
+    players_data = b"".join(NAME_SIZE.pack(len(name)) + name for name in (player.encode() for player in players))
+    state = b"".join(
+        (
+            PLAYERS_COUNT.pack(len(players)),
+            players_data,
+            _column("i", (vertex.hp for vertex in vertices)),
+            _column("H", (player_ids.get(vertex.owner, 0) for vertex in vertices)),
+        )
+    )
+
+    header = HEADER.pack(
+        zlib.crc32(layout), graph.bounds[0], graph.bounds[1], graph.dense, len(vertices), len(graph.edges), len(names)
+    )
+    return header + layout + state
+
+
+def unpack(data: bytes, known_layout: int | None = None) -> Dict[str, Any]:
+    """Unpack snapshot bytes, layout part is skipped (vertices and edges are None) if its checksum is known_layout"""
+    layout, bounds_x, bounds_y, dense, count, edges_count, names_size = HEADER.unpack_from(data)
+    offset = HEADER.size
+    unpacked: Dict[str, Any] = {
+        "layout": layout,
+        "bounds": (bounds_x, bounds_y),
+        "dense": dense,
+        "vertices": None,
+        "edges": None,
+    }
+
+    layout_size = count * 6 + edges_count * 8 + names_size
+    if layout != known_layout:
+        xs = _read_column("H", data, offset, count)
+        ys = _read_column("H", data, offset + count * 2, count)
+        sizes = _read_column("B", data, offset + count * 4, count)
+        mains = _read_column("B", data, offset + count * 5, count)
+        edges = _read_column("I", data, offset + count * 6, edges_count * 2)
+        names_offset = offset + count * 6 + edges_count * 8
+        names = data[names_offset : names_offset + names_size].decode().split("\n")
+        unpacked["vertices"] = [
+            Vertex(xs[i], ys[i], None, bool(mains[i]), sizes[i], names[i]) for i in range(count)
+        ]
+        unpacked["edges"] = list(zip(edges[0::2], edges[1::2]))
+    offset += layout_size
+
+    (players_count,) = PLAYERS_COUNT.unpack_from(data, offset)
+    offset += PLAYERS_COUNT.size
+    players: List[str | None] = [None]
+    for _ in range(players_count):
+        (name_size,) = NAME_SIZE.unpack_from(data, offset)
+        offset += NAME_SIZE.size
+        players.append(data[offset : offset + name_size].decode())
+        offset += name_size
+    unpacked["hp"] = _read_column("i", data, offset, count)
+    unpacked["owners"] = [players[owner] for owner in _read_column("H", data, offset + count * 4, count)]
+    return unpacked
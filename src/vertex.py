@@ -6,6 +6,8 @@ from typing import Any, Dict
 class Vertex:
     """Vertex class implementing point on graph with data"""
 
+    __slots__ = ("x", "y", "owner", "is_main", "size", "hp", "name")
+
     def __init__(
         self,
         x: int,
@@ -1,10 +1,11 @@
 """ Game view class module"""
 
-import queue
-from typing import Dict, List, Literal, Tuple
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Literal, Tuple
 
 import pygame
 
+from src import profiling
 from src.graph import Graph
 from src.view_constants import (
     BACKGROUND_COLOR,
@@ -12,6 +13,7 @@ from src.view_constants import (
     DEFAULT_COLOR,
     FONT,
     FONT_SIZE,
+    FPS,
     GRAPH_OFFSET,
     HINT_FONT,
     HINT_FONT_SIZE,
@@ -19,6 +21,10 @@ from src.view_constants import (
     LEGEND_FONT_SIZE,
     LEGEND_WIDTH,
     MIN_WIGTH,
+    OVERLAY_FONT,
+    OVERLAY_FONT_SIZE,
+    OVERLAY_PHASES,
+    TEXT_CACHE_SIZE,
     TYPING_HEIGHT,
 )
 
@@ -33,26 +39,32 @@ class View:
         self.graph_: Graph = graph
         self.legend_: Dict[str, int] = legend if legend is not None else {}
         self.words: List[str] = []
+        self.choose_input: str = ""  # vertex name typed in choose mode
 
-        self.events: queue.Queue[Tuple[Literal["attack", "change"], int]] = queue.Queue()
+        # called from view thread for each player action (kind, vertex index, attack sequence number),
+        # client sets it to hand actions to network loop
+        self.on_event: Callable[[Tuple[Literal["attack", "change"], int, int]], None] = lambda event: None
+        self.attack_seq: int = 0  # sequence number of last typed word
+        self.pending: deque[Tuple[int, int]] = deque()  # (seq, vertex index) attacks not yet confirmed by server
 
         self.running: bool = False
         self.lock = None
 
         self.my_name: str = name
-        self.current_vertex: str = None
-        for vertex in self.graph.vertices:  # set current vertex to mains
-            if vertex.owner == name and vertex.is_main:
-                self.current_vertex = vertex.name
-                break
-        assert self.current_vertex is not None, "No main vertex for player"
+        main_index = self.graph.get_main(name)  # set current vertex to mains
+        assert main_index is not None, "No main vertex for player"
+        self.current_vertex: str = self.graph.vertices[main_index].name
 
         self.mode: Literal["choose", "default", "viewer"] = "default"
 
+        self.fonts: Dict[Tuple[str, int, bool], pygame.font.Font] = {}
+        self.texts: OrderedDict[Tuple, pygame.Surface] = OrderedDict()  # LRU cache of rendered text
+
         pygame.init()
         self.window_size = (
             max(graph.bounds[0] + GRAPH_OFFSET * 2 + LEGEND_WIDTH, MIN_WIGTH),
-            max(graph.bounds[1] + GRAPH_OFFSET * 2, (LEGEND_FONT_SIZE + 5) * 5) + TYPING_HEIGHT,
+            max(graph.bounds[1] + GRAPH_OFFSET * 2, (LEGEND_FONT_SIZE + 5) * max(5, len(self.legend_)))
+            + TYPING_HEIGHT,
         )
         self.screen = pygame.display.set_mode(self.window_size)
         pygame.display.set_caption("Game")
@@ -61,6 +73,21 @@ class View:
         if MIN_WIGTH > graph.bounds[0] + GRAPH_OFFSET * 2:  # center the graph
             self.graph_start_point = (MIN_WIGTH // 2 - graph.bounds[0] // 2, GRAPH_OFFSET)
 
+        width, height = self.window_size
+        self.graph_rect = pygame.Rect(0, 0, width - LEGEND_WIDTH, height - TYPING_HEIGHT)
+        self.legend_rect = pygame.Rect(width - LEGEND_WIDTH, 0, LEGEND_WIDTH, height - TYPING_HEIGHT)
+        self.typing_rect = pygame.Rect(0, height - TYPING_HEIGHT, width, TYPING_HEIGHT)
+        self.dividers_rects = [
+            pygame.Rect(0, height - TYPING_HEIGHT - 2, width, 4),
+            pygame.Rect(width - LEGEND_WIDTH - 2, 0, 4, height - TYPING_HEIGHT),
+        ]
+        overlay_height = (OVERLAY_FONT_SIZE + 2) * len(OVERLAY_PHASES) + 4
+        self.overlay_rect = pygame.Rect(  # frame timing overlay in bottom of legend, drawn only when profiling
+            self.legend_rect.x + 2, self.legend_rect.bottom - overlay_height, LEGEND_WIDTH - 2, overlay_height
+        )
+        self.graph_layer = pygame.Surface(self.graph_rect.size)  # edges and vertices, redrawn on graph change
+        self.drawn: Dict[str, Any] = {}  # region -> state it was last drawn for
+
     @property
     def graph(self) -> Graph:
         """Get graph"""
@@ -78,74 +105,178 @@ class View:
         return self.legend_
 
     def update(self):
-        """Update the display"""
-        self.screen.fill(BACKGROUND_COLOR)
-
-        self.__draw_graph()
-        pygame.draw.line(
-            self.screen,
-            CONTRAST_COLOR,
-            (0, self.window_size[1] - TYPING_HEIGHT),
-            (self.window_size[0], self.window_size[1] - TYPING_HEIGHT),
-            2,
-        )  # blocks dividor
-        self.__draw_typing_block()
-        pygame.draw.line(
-            self.screen,
-            CONTRAST_COLOR,
-            (self.window_size[0] - LEGEND_WIDTH, 0),
-            (self.window_size[0] - LEGEND_WIDTH, self.window_size[1] - TYPING_HEIGHT),
-            2,
-        )  # legend dividor
-        self.__draw_legend()
-        pygame.display.flip()
-
-    def __draw_graph(self):
-        for edge in self.graph.edges:
+        """Redraw changed display regions (graph, typing block, legend) and update only them"""
+        graph = self.graph
+        dirty: List[pygame.Rect] = []
+
+        with profiling.timer("predict"):
+            if self.lock is not None:  # server deltas and acknowledgements are applied together under lock
+                with self.lock:
+                    predictions = self.predict(graph)
+            else:
+                predictions = self.predict(graph)
+        owners = tuple((i, owner) for i, (owner, _) in sorted(predictions.items()))
+        if self.drawn.get("layer") != (graph.owners_revision, owners):  # edges or owners changed, hp is in hints
+            self.drawn["layer"] = (graph.owners_revision, owners)
+            with profiling.timer("graph layer"):
+                self.__draw_graph_layer(graph, predictions)
+        graph_state = (graph.revision, self.mode, self.current_vertex, tuple(sorted(predictions.items())))
+        if self.drawn.get("graph") != graph_state:
+            self.drawn["graph"] = graph_state
+            with profiling.timer("graph"):
+                self.screen.set_clip(self.graph_rect)
+                self.screen.blit(self.graph_layer, self.graph_rect)
+                self.__draw_hints(graph, predictions)
+            dirty.append(self.graph_rect)
+
+        typing_state = (self.mode, self.choose_input, tuple(self.words))
+        if self.drawn.get("typing") != typing_state:
+            self.drawn["typing"] = typing_state
+            with profiling.timer("typing"):
+                self.screen.set_clip(self.typing_rect)
+                self.screen.fill(BACKGROUND_COLOR)
+                self.__draw_typing_block()
+            dirty.append(self.typing_rect)
+
+        legend_state = tuple(self.legend.items())
+        if self.drawn.get("legend") != legend_state:
+            self.drawn["legend"] = legend_state
+            with profiling.timer("legend"):
+                self.screen.set_clip(self.legend_rect)
+                self.screen.fill(BACKGROUND_COLOR)
+                self.__draw_legend()
+            dirty.append(self.legend_rect)
+
+        if profiling.enabled():  # timings change every frame
+            self.screen.set_clip(self.overlay_rect)
+            self.screen.fill(BACKGROUND_COLOR)
+            self.__draw_overlay()
+            dirty.append(self.overlay_rect)
+
+        self.screen.set_clip(None)
+        if dirty:
+            pygame.draw.line(
+                self.screen,
+                CONTRAST_COLOR,
+                (0, self.window_size[1] - TYPING_HEIGHT),
+                (self.window_size[0], self.window_size[1] - TYPING_HEIGHT),
+                2,
+            )  # blocks dividor
+            pygame.draw.line(
+                self.screen,
+                CONTRAST_COLOR,
+                (self.window_size[0] - LEGEND_WIDTH, 0),
+                (self.window_size[0] - LEGEND_WIDTH, self.window_size[1] - TYPING_HEIGHT),
+                2,
+            )  # legend dividor
+            dirty += self.dividers_rects
+            with profiling.timer("display"):
+                pygame.display.update(dirty)
+
+    def predict(self, graph: Graph) -> Dict[int, Tuple[str | None, int]]:
+        """Owner and hp of vertices after applying not yet confirmed attacks"""
+        predictions: Dict[int, Tuple[str | None, int]] = {}
+        for _, vertex_index in list(self.pending):
+            vertex = graph.vertices[vertex_index]
+            owner, hp = predictions.get(vertex_index, (vertex.owner, vertex.hp))
+            if owner == self.my_name:
+                hp += 1
+            else:
+                hp -= 1
+                if hp == 0:  # same capture rule as server
+                    owner, hp = self.my_name, 3
+            predictions[vertex_index] = (owner, hp)
+        return predictions
+
+    def acknowledge(self, seq: int) -> None:
+        """Drop predictions for attacks already applied by server"""
+        while self.pending and self.pending[0][0] <= seq:
+            self.pending.popleft()
+
+    def invalidate(self) -> None:
+        """Force full redraw on next update"""
+        self.drawn = {}
+
+    def __font(self, name: str, size: int, bold: bool = False) -> pygame.font.Font:
+        """Get cached font"""
+        key = (name, size, bold)
+        if key not in self.fonts:
+            self.fonts[key] = pygame.font.SysFont(name, size, bold)
+        return self.fonts[key]
+
+    def __text(
+        self,
+        font: Tuple[str, int, bool],
+        text: str,
+        color: Tuple[int, int, int],
+        background: Tuple[int, int, int] | None = None,
+        shadow: Tuple[int, int, int] | None = None,
+    ) -> pygame.Surface:
+        """Get cached rendered text, with shadow it is 2px bigger and composited with outline of shadow color"""
+        key = (font, text, color, background, shadow)
+        surface = self.texts.get(key)
+        if surface is not None:
+            self.texts.move_to_end(key)
+            return surface
+
+        surface = self.__font(*font).render(text, 1, color, background)
+        if shadow is not None:
+            outline = self.__font(*font).render(text, 1, shadow)
+            composited = pygame.Surface((surface.get_width() + 2, surface.get_height() + 2), pygame.SRCALPHA)
+            for position in ((0, 0), (2, 0), (0, 2), (2, 2)):
+                composited.blit(outline, position)
+            composited.blit(surface, (1, 1))
+            surface = composited
+
+        self.texts[key] = surface
+        if len(self.texts) > TEXT_CACHE_SIZE:
+            self.texts.popitem(last=False)
+        return surface
+
+    def __draw_graph_layer(self, graph: Graph, predictions: Dict[int, Tuple[str | None, int]]) -> None:
+        """Draw edges and vertices to cached graph layer"""
+        layer = self.graph_layer
+        layer.fill(BACKGROUND_COLOR)
+        owners = [vertex.owner for vertex in graph.vertices]
+        for i, (owner, _) in predictions.items():
+            owners[i] = owner
+        for edge in graph.edges:
             start = (
-                self.graph.vertices[edge[0]].x + self.graph_start_point[0],
-                self.graph.vertices[edge[0]].y + self.graph_start_point[1],
+                graph.vertices[edge[0]].x + self.graph_start_point[0],
+                graph.vertices[edge[0]].y + self.graph_start_point[1],
             )
             end = (
-                self.graph.vertices[edge[1]].x + self.graph_start_point[0],
-                self.graph.vertices[edge[1]].y + self.graph_start_point[1],
+                graph.vertices[edge[1]].x + self.graph_start_point[0],
+                graph.vertices[edge[1]].y + self.graph_start_point[1],
             )
             color = DEFAULT_COLOR
-            if self.graph.vertices[edge[0]].owner == self.graph.vertices[edge[1]].owner:
-                color = self.color_scheme.get(self.graph.vertices[edge[0]].owner, DEFAULT_COLOR)
-            pygame.draw.line(self.screen, color, start, end, 2)
+            if owners[edge[0]] == owners[edge[1]]:
+                color = self.color_scheme.get(owners[edge[0]], DEFAULT_COLOR)
+            pygame.draw.line(layer, color, start, end, 2)
 
-        for i, vertex in enumerate(self.graph.vertices):
-            owner = vertex.owner
-            color = self.color_scheme.get(owner, DEFAULT_COLOR)
+        for i, vertex in enumerate(graph.vertices):
+            color = self.color_scheme.get(owners[i], DEFAULT_COLOR)
             if vertex.is_main:
                 pygame.draw.circle(
-                    self.screen,
+                    layer,
                     CONTRAST_COLOR,
                     (vertex.x + self.graph_start_point[0], vertex.y + self.graph_start_point[1]),
                     vertex.size,
                     3,
                 )  # main vertex border
-                if self.mode == "default":  # owner hint needed
-                    hint = pygame.font.SysFont(HINT_FONT, HINT_FONT_SIZE, True).render(vertex.owner, 1, CONTRAST_COLOR)
-                    self.screen.blit(
-                        hint,
-                        (
-                            vertex.x + self.graph_start_point[0] - hint.get_width() // 2,
-                            vertex.y + self.graph_start_point[1] + vertex.size,
-                        ),
-                    )
             pygame.draw.circle(
-                self.screen,
+                layer,
                 color,
                 (vertex.x + self.graph_start_point[0], vertex.y + self.graph_start_point[1]),
                 vertex.size - (2 if vertex.is_main else 0),
             )
 
-            if self.mode == "choose" and self.graph.reachable(self.my_name, i) and not vertex.is_main:  # name hint
-                hint = pygame.font.SysFont(HINT_FONT, HINT_FONT_SIZE, True).render(
-                    vertex.name, 1, CONTRAST_COLOR, BACKGROUND_COLOR
-                )
+    def __draw_hints(self, graph: Graph, predictions: Dict[int, Tuple[str | None, int]]) -> None:
+        """Draw mode dependent hints and current vertex border over graph"""
+        for i, vertex in enumerate(graph.vertices):
+            hp = predictions[i][1] if i in predictions else vertex.hp
+            if vertex.is_main and self.mode == "default":  # owner hint needed
+                hint = self.__text((HINT_FONT, HINT_FONT_SIZE, True), vertex.owner, CONTRAST_COLOR)
                 self.screen.blit(
                     hint,
                     (
@@ -153,10 +284,18 @@ class View:
                         vertex.y + self.graph_start_point[1] + vertex.size,
                     ),
                 )
-            elif self.mode == "default" and vertex.hp >= 0:  # hp hint
-                hint = pygame.font.SysFont(HINT_FONT, HINT_FONT_SIZE).render(
-                    str(vertex.hp), 1, CONTRAST_COLOR, BACKGROUND_COLOR
+
+            if self.mode == "choose" and graph.reachable(self.my_name, i) and not vertex.is_main:  # name hint
+                hint = self.__text((HINT_FONT, HINT_FONT_SIZE, True), vertex.name, CONTRAST_COLOR, BACKGROUND_COLOR)
+                self.screen.blit(
+                    hint,
+                    (
+                        vertex.x + self.graph_start_point[0] - hint.get_width() // 2,
+                        vertex.y + self.graph_start_point[1] + vertex.size,
+                    ),
                 )
+            elif self.mode == "default" and hp >= 0:  # hp hint
+                hint = self.__text((HINT_FONT, HINT_FONT_SIZE, False), str(hp), CONTRAST_COLOR, BACKGROUND_COLOR)
                 self.screen.blit(
                     hint,
                     (
@@ -183,13 +322,13 @@ class View:
         line = ""
         next_line_y = self.window_size[1] - TYPING_HEIGHT + 5
 
-        for word in self.words:
+        for word in [self.choose_input] if self.mode == "choose" else self.words:
             oldline = line
             line += f"{word} "
-            width, _ = pygame.font.SysFont(FONT, FONT_SIZE).size(line)
+            width, _ = self.__font(FONT, FONT_SIZE).size(line)
 
             if width > self.window_size[0]:
-                text = pygame.font.SysFont(FONT, FONT_SIZE).render(oldline, 1, CONTRAST_COLOR)
+                text = self.__text((FONT, FONT_SIZE, False), oldline, CONTRAST_COLOR)
                 self.screen.blit(text, (5, next_line_y))
                 next_line_y += FONT_SIZE + 5
                 line = f"{word} "
@@ -198,7 +337,7 @@ class View:
                 break
 
         if next_line_y < self.window_size[1]:
-            text = pygame.font.SysFont(FONT, FONT_SIZE).render(line, 1, CONTRAST_COLOR)
+            text = self.__text((FONT, FONT_SIZE, False), line, CONTRAST_COLOR)
             self.screen.blit(text, (5, next_line_y))
 
     def __draw_legend(self):
@@ -206,71 +345,75 @@ class View:
         legend_start_point = (self.window_size[0] - LEGEND_WIDTH + 5, 5)
         for i, (key, value) in enumerate(self.legend.items()):
             color = self.color_scheme.get(key, DEFAULT_COLOR)
-            text = pygame.font.SysFont(LEGEND_FONT, LEGEND_FONT_SIZE).render(f"{key}: {value}", 1, color)
-            shadow = pygame.font.SysFont(LEGEND_FONT, LEGEND_FONT_SIZE).render(f"{key}: {value}", 1, CONTRAST_COLOR)
-            self.screen.blit(
-                shadow, (legend_start_point[0] + 1, legend_start_point[1] + i * (LEGEND_FONT_SIZE + 5) + 1)
-            )
-            self.screen.blit(
-                shadow, (legend_start_point[0] - 1, legend_start_point[1] + i * (LEGEND_FONT_SIZE + 5) + 1)
-            )
-            self.screen.blit(
-                shadow, (legend_start_point[0] + 1, legend_start_point[1] + i * (LEGEND_FONT_SIZE + 5) - 1)
-            )
-            self.screen.blit(
-                shadow, (legend_start_point[0] - 1, legend_start_point[1] + i * (LEGEND_FONT_SIZE + 5) - 1)
-            )
-            self.screen.blit(text, (legend_start_point[0], legend_start_point[1] + i * (LEGEND_FONT_SIZE + 5)))
+            text = self.__text((LEGEND_FONT, LEGEND_FONT_SIZE, False), f"{key}: {value}", color, shadow=CONTRAST_COLOR)
+            self.screen.blit(text, (legend_start_point[0] - 1, legend_start_point[1] + i * (LEGEND_FONT_SIZE + 5) - 1))
+
+    def __draw_overlay(self):
+        """Draw last duration of frame phases"""
+        font = self.__font(OVERLAY_FONT, OVERLAY_FONT_SIZE)
+        for i, phase in enumerate(OVERLAY_PHASES):
+            duration = profiling.last.get(phase)
+            text = f"{phase}: {duration * 1000:.2f} ms" if duration is not None else f"{phase}: -"
+            position = (self.overlay_rect.x + 3, self.overlay_rect.y + 2 + i * (OVERLAY_FONT_SIZE + 2))
+            self.screen.blit(font.render(text, 1, CONTRAST_COLOR), position)  # not cached, changes every frame
 
     def run(self) -> None:
-        """Run the game"""
+        """Run the game, handling input as soon as it arrives and drawing at most FPS frames per second"""
         self.running = True
-        clock = pygame.time.Clock()
-
-        while self.running:
-
-            for event in pygame.event.get():
-
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_TAB:  # change mode
-                        if self.mode == "default":
-                            self.mode = "choose"
-                            self.words = [""]
-                        elif self.mode == "choose":
-                            self.mode = "default"
-                        break
-
-                    if self.mode == "default":
-                        if len(self.words) > 0 and len(self.words[0]) > 0 and event.unicode == self.words[0][0]:
-                            self.words[0] = self.words[0][1:]
-                            if len(self.words[0]) == 0:
-                                self.words.pop(0)
-                                self.events.put(("attack", self.graph.get_id(self.current_vertex)))
-                    elif self.mode == "choose":
-                        if event.unicode.isalpha():
-                            self.words[0] += event.unicode
-                            if len(self.words[0]) > 15:
-                                self.words[0] = self.words[0][:15]
-                        elif event.key == pygame.K_BACKSPACE and len(self.words[0]) > 0:
-                            self.words[0] = self.words[0][:-1]
-                        elif event.key == pygame.K_RETURN:
-                            if any(
-                                [
-                                    self.graph.vertices[i].name == self.words[0]
-                                    and self.graph.reachable(self.my_name, i)
-                                    for i in range(len(self.graph.vertices))
-                                ]
-                            ):
-                                self.current_vertex = self.words[0]
-                                self.words = []
-                                self.events.put(("change", self.graph.get_id(self.current_vertex)))
-                                self.mode = "default"
-                            else:
-                                print("No such vertex to go.")
-
-            self.update()
-            clock.tick(20)
+        frame_time = 1000 // FPS
+        next_frame = pygame.time.get_ticks()
+
+        with profiling.Session("view"):
+            while self.running:
+                timeout = next_frame - pygame.time.get_ticks()
+                event = pygame.event.wait(timeout) if timeout > 0 else pygame.event.poll()
+                with profiling.timer("events"):
+                    while event.type != pygame.NOEVENT:
+                        self.handle_event(event)
+                        event = pygame.event.poll()
+
+                if pygame.time.get_ticks() >= next_frame:
+                    with profiling.timer("frame"):
+                        self.update()
+                    next_frame = pygame.time.get_ticks() + frame_time
 
         pygame.quit()
+
+    def handle_event(self, event: pygame.event.Event) -> None:
+        """Handle one pygame event"""
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):  # window content lost
+            self.invalidate()
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_TAB:  # change mode
+                if self.mode == "default":
+                    self.mode = "choose"
+                    self.choose_input = ""
+                elif self.mode == "choose":
+                    self.mode = "default"
+                return
+
+            if self.mode == "default":
+                if len(self.words) > 0 and len(self.words[0]) > 0 and event.unicode == self.words[0][0]:
+                    self.words[0] = self.words[0][1:]
+                    if len(self.words[0]) == 0:
+                        self.words.pop(0)
+                        vertex_index = self.graph.get_id(self.current_vertex)
+                        self.attack_seq += 1
+                        self.pending.append((self.attack_seq, vertex_index))  # show result before server confirms
+                        self.on_event(("attack", vertex_index, self.attack_seq))
+            elif self.mode == "choose":
+                if event.unicode.isalpha():
+                    self.choose_input = (self.choose_input + event.unicode)[:15]
+                elif event.key == pygame.K_BACKSPACE and len(self.choose_input) > 0:
+                    self.choose_input = self.choose_input[:-1]
+                elif event.key == pygame.K_RETURN:
+                    vertex_index = self.graph.get_id(self.choose_input)
+                    if vertex_index is not None and self.graph.reachable(self.my_name, vertex_index):
+                        self.current_vertex = self.choose_input
+                        self.words = []
+                        self.on_event(("change", vertex_index, self.attack_seq))
+                        self.mode = "default"
+                    else:
+                        print("No such vertex to go.")
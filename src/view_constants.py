@@ -17,3 +17,10 @@ LEGEND_FONT_SIZE = 30  # font size for legend
 TYPING_HEIGHT = 100  # height of typing block
 FONT = "comicsansms"  # font for typing block
 FONT_SIZE = 30  # font size for typing block
+
+FPS = 60  # frame rate cap, input is handled between frames as it arrives
+TEXT_CACHE_SIZE = 1024  # rendered text surfaces kept in view cache
+
+OVERLAY_FONT = "arial"  # font for frame timing overlay shown when profiling
+OVERLAY_FONT_SIZE = 14  # font size for frame timing overlay
+OVERLAY_PHASES = ["frame", "events", "predict", "graph layer", "graph", "typing", "legend", "display"]  # shown phases
@@ -0,0 +1,30 @@
+""" Word bank module """
+
+import os
+import random
+from typing import Dict, List
+
+
+class WordBank:
+    """Words grouped by length, each group packed into one string of equal length words"""
+
+    def __init__(self, path: str = os.path.join("src", "data", "words.txt")):
+        groups: Dict[int, List[str]] = {}
+        with open(path, "r", encoding="utf-8") as file:
+            for word in file.read().split():
+                groups.setdefault(len(word), []).append(word)
+        self.buckets: Dict[int, str] = {length: "".join(words) for length, words in groups.items()}
+        self.counts: Dict[int, int] = {length: len(words) for length, words in groups.items()}
+        self.lengths: List[int] = sorted(self.counts)
+
+    def nearest_length(self, length: int) -> int:
+        """Closest word length present in bank"""
+        return min(self.lengths, key=lambda present: (abs(present - length), present))
+
+    def sample(self, length: int, count: int) -> List[str]:
+        """Get up to count distinct random words of given (or nearest present) length"""
+        if length not in self.counts:
+            length = self.nearest_length(length)
+        bucket = self.buckets[length]
+        indices = random.sample(range(self.counts[length]), min(count, self.counts[length]))
+        return [bucket[index * length : (index + 1) * length] for index in indices]
@@ -1,20 +1,25 @@
 import asyncio
 import tkinter as tk
 
+from src import profiling
 from src.client import Client
-from src.server import Server
+from src.log import setup_logging
+from src.server_menu import MenuServer
 
 
 def start_server(root: tk.Tk):
     root.destroy()
-    server = Server()
-    asyncio.run(server.run())
+    setup_logging()
+    server = MenuServer()
+    with profiling.Session("server"):
+        asyncio.run(server.run())
 
 
 def start_client(root: tk.Tk):
     root.destroy()
     client = Client()
-    asyncio.run(client.run())
+    with profiling.Session("client"):
+        asyncio.run(client.run())
 
 
 def main():